@@ -1,21 +1,62 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sse_starlette.sse import EventSourceResponse
-from typing import List
+from typing import Iterator, List, Optional
 import json
 import asyncio
-from llm_model import generate_response
-from gpt_researcher import GPTResearcher
-from services.question_service import prepare_question, find_existing_solution
-from services.research_service import (process_research_report)
+from services.question_service import prepare_question, find_existing_solution, normalize_question
+from embedding_service import embed_text_async
+from services.chat_service import answer_question, stream_answer
+from services.image_service import analyze_image
 from models import (
     AskResponseModel, AskRequestModel, SolutionResponseModel,
-    SolutionModel, QuestionModel, ChatResponseModel, InventoryBase
+    SolutionModel, QuestionModel, ChatResponseModel, InventoryBase, Match
 )
-from db import solutions, questions, inventory
+from db import (
+    solutions, questions, delete_solution_cascade,
+    get_solution_with_inventory, attach_inventory, cache_stats
+)
+from status_broker import status_broker
+from job_queue import investigation_queue, QueueFullError, ACTIVE_STATUSES
+from llm_scheduler import llm_scheduler
 from datetime import datetime
+import os
+
+# Whether status streams also listen to Firestore for changes made by other instances
+STATUS_SNAPSHOT_LISTENER = os.getenv("STATUS_SNAPSHOT_LISTENER", "true").lower() == "true"
+# Seconds without a pushed update before a status stream re-reads the solution
+STATUS_RESYNC_SECONDS = float(os.getenv("STATUS_RESYNC_SECONDS", "30"))
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+def ndjson_response(items: Iterator[dict]) -> StreamingResponse:
+    """Stream dicts as newline-delimited JSON without materializing the list."""
+    # Pull the first item eagerly so query errors (e.g. a bad cursor) surface before streaming starts
+    first = next(items, None)
+
+    def body():
+        if first is None:
+            return
+        yield json.dumps(first) + "\n"
+        for item in items:
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+def iter_with_inventory(items: Iterator[dict], chunk_size: int = 100) -> Iterator[dict]:
+    """Attach inventory to streamed solutions with one batched read per chunk."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield from attach_inventory(chunk)
+            chunk = []
+    if chunk:
+        yield from attach_inventory(chunk)
+
 @router.post("/ask",
              response_model=AskResponseModel,
              summary="Ask a question with manufacturing context",
@@ -25,10 +66,10 @@ async def ask_question(request: AskRequestModel):
     image_analysis = None
 
     if request.image_data:
-        image_analysis = await generate_response(
-            "Analyze this image and describe what you see, focusing on any visible technical issues, machine parts, or error displays.",
-            image_data=request.image_data
-        )
+        try:
+            image_analysis = await analyze_image(request.image_data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     # Prepare the question by combining text and image analysis if available
     question_text = request.question.strip()
@@ -37,7 +78,7 @@ async def ask_question(request: AskRequestModel):
     else:
         full_question = await prepare_question(question_text)
 
-    matches = find_existing_solution(full_question)
+    matches = await find_existing_solution(full_question)
 
     if matches:
         return {"matches": matches}
@@ -47,13 +88,47 @@ async def ask_question(request: AskRequestModel):
         detail="No verified solutions found. Please document your fix."
     )
 
+@router.post("/ask/stream",
+             summary="Ask a question with manufacturing context (streaming)",
+             description="Like /ask, but streams each stage as a Server-Sent Event: image_analysis (only with image_data), question, matches, then complete",
+             operation_id="askStream")
+async def ask_question_stream(request: AskRequestModel):
+    async def event_generator():
+        try:
+            image_analysis = None
+            if request.image_data:
+                image_analysis = await analyze_image(request.image_data)
+                yield {"event": "image_analysis", "data": json.dumps({"image_analysis": image_analysis})}
+
+            # Prepare the question by combining text and image analysis if available
+            question_text = request.question.strip()
+            if image_analysis:
+                full_question = await prepare_question(f"Question: {question_text}\nImage Analysis: {image_analysis}")
+            else:
+                full_question = await prepare_question(question_text)
+            yield {"event": "question", "data": json.dumps({"question": full_question})}
+
+            matches = await find_existing_solution(full_question)
+            yield {"event": "matches", "data": json.dumps({
+                "matches": [Match(**match).model_dump() for match in matches]
+            })}
+            yield {"event": "complete", "data": json.dumps({})}
+        except Exception as e:
+            print(f"Error in ask stream: {str(e)}")
+            yield {"event": "error", "data": json.dumps({"error": str(e)})}
+
+    return EventSourceResponse(event_generator())
+
 @router.get("/solutions/recent",
             response_model=List[SolutionModel],
             summary="Get recent solutions",
             description="Retrieve the 5 most recent solutions from the database",
             operation_id="listRecentSolutions")
-def get_recent_solutions():
-    return solutions.list_recent()
+def get_recent_solutions(
+    include_inventory: bool = Query(False, description="Include each solution's inventory item"),
+):
+    recent = solutions.list_recent()
+    return attach_inventory(recent) if include_inventory else recent
 
 @router.get("/solutions/{solution_id}",
             response_model=SolutionModel,
@@ -71,30 +146,70 @@ async def get_solution(solution_id: str):
             summary="Get all solutions",
             description="Retrieve all solutions from the database",
             operation_id="listSolutions")
-def get_all_solutions():
-    return solutions.list_all()
+def get_all_solutions(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit to return all solutions"),
+    after: Optional[str] = Query(None, description="Cursor: return solutions after this solution ID"),
+    stream: bool = Query(False, description="Stream the results as NDJSON"),
+    include_inventory: bool = Query(False, description="Include each solution's inventory item"),
+):
+    try:
+        if stream:
+            items = solutions.iter_page(limit, after)
+            return ndjson_response(iter_with_inventory(items) if include_inventory else items)
+        if limit is None and after is None:
+            items, next_cursor = solutions.list_all(), None
+        else:
+            items, next_cursor = solutions.list_page(limit or DEFAULT_PAGE_SIZE, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return attach_inventory(items) if include_inventory else items
 
 @router.get("/questions",
             response_model=List[QuestionModel],
             summary="Get all questions",
             description="Retrieve all questions from the database",
             operation_id="listQuestions")
-def get_all_questions():
-    return questions.list_all()
+def get_all_questions(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit to return all questions"),
+    after: Optional[str] = Query(None, description="Cursor: return questions after this question ID"),
+    stream: bool = Query(False, description="Stream the results as NDJSON"),
+    include_embedding: bool = Query(False, description="Include each question's embedding vector"),
+):
+    try:
+        if stream:
+            return ndjson_response(questions.iter_page(limit, after, include_embedding))
+        if limit is None and after is None:
+            return list(questions.iter_page(include_embedding=include_embedding))
+        items, next_cursor = questions.list_page(limit or DEFAULT_PAGE_SIZE, after, include_embedding)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
 @router.post("/investigate",
              response_model=SolutionResponseModel,
              summary="Start an investigation",
              description="Initiate a background research task for a given question",
              operation_id="investigate")
-async def get_report(data: AskRequestModel, background_tasks: BackgroundTasks):
+async def get_report(data: AskRequestModel):
+    # Reject early, before spending LLM calls on a request that cannot be queued
+    if investigation_queue.full():
+        raise HTTPException(status_code=429, detail="Too many investigations in progress, please try again later")
+
     image_analysis = None
 
     if data.image_data:
-        image_analysis = await generate_response(
-            "Analyze this image and describe what you see, focusing on any visible technical issues, machine parts, or error displays.",
-            image_data=data.image_data
-        )
+        try:
+            image_analysis = await analyze_image(data.image_data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     # Prepare the question by combining text and image analysis if available
     question_text = data.question.strip()
@@ -105,41 +220,56 @@ async def get_report(data: AskRequestModel, background_tasks: BackgroundTasks):
     else:
         full_question = await prepare_question(question_text)
 
-    report_type = "research_report"
-    researcher = GPTResearcher(full_question, report_type)
+    # Attach to an investigation of the same question that is already running
+    question_key = normalize_question(full_question)
+    existing_id = investigation_queue.find_in_flight(question_key)
+    if not existing_id:
+        embedding = await embed_text_async(full_question)
+        # Other instances only dedupe on the exact key; check them before the final local check
+        existing_id = await asyncio.to_thread(solutions.find_active_by_key, question_key, ACTIVE_STATUSES)
+        existing_id = existing_id or investigation_queue.find_in_flight(question_key, embedding)
+    if existing_id:
+        # A reservation resolves to None if its request failed to start the investigation
+        existing_id = await investigation_queue.resolve(existing_id)
+    if existing_id:
+        return {
+            "message": "Investigation already in progress",
+            "solution": {"id": existing_id}
+        }
 
-    if not researcher:
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to initialize researcher"
-        )
+    if investigation_queue.full():
+        raise HTTPException(status_code=429, detail="Too many investigations in progress, please try again later")
 
+    # Registered before any await, so concurrent identical requests cannot both get past the check
+    reservation = investigation_queue.reserve(question_key, embedding)
     try:
         solution_data = {
-            'text': '',  # Will be updated by background task
+            'text': '',  # Will be updated by the investigation worker
             'verified': False,
             'title': full_question,
-            'confidence': "0"  # Initialize with 0 confidence
+            'question_key': question_key,
+            'confidence': "0",  # Initialize with 0 confidence
+            'status': 'queued'
         }
 
-        solution_id = solutions.create(solution_data)
-
-        background_tasks.add_task(
-            process_research_report,
-            full_question,
-            researcher,
-            solution_id
-        )
+        solution_id = await asyncio.to_thread(solutions.create, solution_data)
+        investigation_queue.submit(solution_id, full_question, question_key, embedding, reservation=reservation)
 
         return {
             "message": "Investigation started",
             "solution": {"id": solution_id}
         }
+    except QueueFullError as e:
+        # The queue filled up while the document was written; don't leave it queued forever
+        await asyncio.to_thread(solutions.delete, solution_id)
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error starting investigation: {str(e)}"
         )
+    finally:
+        investigation_queue.release(reservation)
 
 @router.post("/chat",
              response_model=ChatResponseModel,
@@ -147,17 +277,25 @@ async def get_report(data: AskRequestModel, background_tasks: BackgroundTasks):
              description="Chat with the solution",
              operation_id="chat")
 async def chat(data: AskRequestModel):
-    solution_list = solutions.list_all()
-    response = await generate_response(f"""
-    You are a helpful assistant that can answer questions about the solutions in the database.
-    The solutions are stored in the database and are indexed for vector similarity.
-    The solutions are: {solution_list}
-    The question is: {data.question}
-    The response should be in the same language as the question.
-    The response should be helpful and informative.
-    """)
+    response = await answer_question(data.question)
     return {"message": response}
 
+@router.post("/chat/stream",
+             summary="Chat with the solution (streaming)",
+             description="Chat with the solution, streaming the answer as Server-Sent Events",
+             operation_id="chatStream")
+async def chat_stream(data: AskRequestModel):
+    async def event_generator():
+        try:
+            async for chunk in stream_answer(data.question):
+                yield {"event": "message", "data": json.dumps({"text": chunk})}
+            yield {"event": "complete", "data": json.dumps({})}
+        except Exception as e:
+            print(f"Error in chat stream: {str(e)}")
+            yield {"event": "error", "data": json.dumps({"error": str(e)})}
+
+    return EventSourceResponse(event_generator())
+
 @router.get("/solutions/{solution_id}/inventory",
             response_model=InventoryBase,
             summary="Get inventory information for a solution",
@@ -165,59 +303,83 @@ async def chat(data: AskRequestModel):
             operation_id="getSolutionInventory")
 async def get_solution_inventory(solution_id: str):
     """Get inventory information for a solution."""
-    solution = solutions.get(solution_id)
-    if not solution or not solution.get('inventory_id'):
+    solution, inventory_item = get_solution_with_inventory(solution_id)
+    if not solution or not inventory_item:
         raise HTTPException(status_code=404, detail=f"Solution id: {solution_id} inventory not found")
 
-    inventory_item = inventory.get(solution['inventory_id'])
     return inventory_item
 
 @router.get("/solutions/{solution_id}/status")
 async def solution_status(solution_id: str):
     """Get solution status via Server-Sent Events."""
     async def event_generator():
-        last_status = None
-        while True:
-            solution = solutions.get(solution_id)
-            if not solution:
-                yield {
-                    "event": "error",
-                    "data": json.dumps({
-                        "id": solution_id,
-                        "status": "error",
-                        "error": "Solution not found"
-                    })
-                }
-                break
-
-            current_status = solution.get('status')
-            if current_status != last_status:
-                # Send the new status
-                data = {
-                    "id": solution_id,
-                    "status": current_status
-                }
-
-                # Include solution data if complete
-                if current_status == 'complete':
-                    inventory_data = None
-                    if solution.get('inventory_id'):
-                        inventory_data = inventory.get(solution['inventory_id'])
-                    data["solution"] = solution
-                    data["inventory"] = inventory_data
-
-                yield {
-                    "event": current_status,
-                    "data": json.dumps(data)
-                }
-
-                # Break the loop if we're in a final state
-                if current_status in ['complete', 'error']:
+        # Subscribe before the initial read so no change can slip in between
+        queue = status_broker.subscribe(solution_id)
+        stop_watch = None
+        if STATUS_SNAPSHOT_LISTENER:
+            # Cross-instance fallback: the investigation may run on another instance
+            def on_change(data):
+                # The change may come from another instance, so the cached copy is stale
+                solutions.invalidate(solution_id)
+                # A deleted document is published as None
+                status_broker.publish(solution_id, None if data is None else data.get('status', ''))
+
+            stop_watch = solutions.watch(solution_id, on_change)
+
+        try:
+            last_status = None
+            solution = await asyncio.to_thread(solutions.get, solution_id)
+            exists = solution is not None
+            current_status = solution.get('status') if solution else None
+            while True:
+                if not exists:
+                    yield {
+                        "event": "error",
+                        "data": json.dumps({
+                            "id": solution_id,
+                            "status": "error",
+                            "error": "Solution not found"
+                        })
+                    }
                     break
 
-                last_status = current_status
-
-            await asyncio.sleep(1)  # Check every second
+                if current_status != last_status:
+                    # Send the new status
+                    data = {
+                        "id": solution_id,
+                        "status": current_status
+                    }
+
+                    # Include solution data if complete
+                    if current_status == 'complete':
+                        solution, inventory_data = await asyncio.to_thread(get_solution_with_inventory, solution_id)
+                        data["solution"] = solution
+                        data["inventory"] = inventory_data
+
+                    yield {
+                        "event": current_status,
+                        "data": json.dumps(data)
+                    }
+
+                    # Break the loop if we're in a final state
+                    if current_status in ['complete', 'error']:
+                        break
+
+                    last_status = current_status
+
+                try:
+                    current_status = await asyncio.wait_for(queue.get(), timeout=STATUS_RESYNC_SECONDS)
+                    exists = current_status is not None
+                except asyncio.TimeoutError:
+                    # Safety net in case a change was published where we could not hear it
+                    solutions.invalidate(solution_id)
+                    solution = await asyncio.to_thread(solutions.get, solution_id)
+                    exists = solution is not None
+                    current_status = solution.get('status') if solution else None
+        finally:
+            status_broker.unsubscribe(solution_id, queue)
+            if stop_watch:
+                stop_watch()
 
     return EventSourceResponse(event_generator())
 
@@ -252,18 +414,22 @@ async def delete_solution(solution_id: str):
     if not solution:
         raise HTTPException(status_code=404, detail=f"Solution id: {solution_id} not found")
 
-    # Delete related inventory if exists
-    if solution.get('inventory_id'):
-        inventory.delete(solution['inventory_id'])
-
-    # Delete related questions
-    questions_list = questions.list_all()
-    for question in questions_list:
-        if question.get('solution_id') == solution_id:
-            questions.delete(question['id'])
-
-    # Delete the solution
-    if not solutions.delete(solution_id):
+    # Delete the solution with its related inventory and questions in batched writes
+    if not delete_solution_cascade(solution_id, solution.get('inventory_id')):
         raise HTTPException(status_code=500, detail="Failed to delete solution")
 
     return {"message": "Solution and related data deleted successfully"}
+
+@router.get("/cache/stats",
+            summary="Get cache statistics",
+            description="Hit/miss counters for the solution and inventory read caches",
+            operation_id="getCacheStats")
+def get_cache_stats():
+    return cache_stats()
+
+@router.get("/jobs/stats",
+            summary="Get investigation queue statistics",
+            description="Pending and running investigations in this instance's worker pool, and the LLM scheduler's limit and load",
+            operation_id="getJobStats")
+def get_job_stats():
+    return {**investigation_queue.stats(), "llm": llm_scheduler.stats()}
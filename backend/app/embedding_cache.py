@@ -0,0 +1,87 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """Content hash identifying an embedding for a given model and text."""
+    return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: in-memory LRU in front of an on-disk SQLite store.
+
+    The disk tier survives restarts; pass `path=None` to keep the cache
+    memory-only.
+    """
+
+    def __init__(self, path: Optional[str], max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            try:
+                self._conn = sqlite3.connect(path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Embedding disk cache disabled: {str(e)}")
+                self._conn = None
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the keys that are present in either tier."""
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    missing.append(key)
+
+            if missing and self._conn is not None:
+                try:
+                    placeholders = ",".join("?" for _ in missing)
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", missing
+                    ).fetchall()
+                except sqlite3.Error as e:
+                    print(f"Error reading embedding cache: {str(e)}")
+                    rows = []
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self._remember(key, vector)
+                    found[key] = vector
+        return found
+
+    def put_many(self, vectors: Dict[str, List[float]]):
+        """Store vectors in both tiers."""
+        if not vectors:
+            return
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, list(vector))
+
+            if self._conn is not None:
+                try:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                        [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()],
+                    )
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing embedding cache: {str(e)}")
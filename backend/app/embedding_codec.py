@@ -0,0 +1,80 @@
+import os
+import struct
+from typing import Optional
+import numpy as np
+
+# Storage format for new embeddings: "float16" (2 bytes per dimension) or
+# "int8" (1 byte per dimension, symmetric scale)
+EMBEDDING_STORAGE_FORMAT = os.getenv("EMBEDDING_STORAGE_FORMAT", "float16").lower()
+
+# Blob layout: 3-byte magic, codec, float32 norm, float32 scale, then the
+# unit-length vector. The 12-byte header keeps the data 4-byte aligned.
+_MAGIC = b"EMB"
+_HEADER = struct.Struct("<3sBff")
+_CODECS = {
+    "float16": (1, np.float16),
+    "int8": (2, np.int8),
+    "float32": (3, np.float32),
+}
+_DTYPES = {code: dtype for code, dtype in _CODECS.values()}
+
+
+def encode(embedding, storage_format: Optional[str] = None) -> bytes:
+    """Pack an embedding into a compact blob holding its direction and its norm."""
+    storage_format = storage_format or EMBEDDING_STORAGE_FORMAT
+    if storage_format not in _CODECS:
+        raise ValueError(f"Unknown embedding storage format: {storage_format!r}")
+    code, dtype = _CODECS[storage_format]
+
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vector))
+    unit = vector / norm if norm else vector
+    scale = 1.0
+    if dtype is np.int8:
+        peak = float(np.abs(unit).max()) if unit.size else 0.0
+        scale = peak / 127 if peak else 1.0
+        data = np.round(unit / scale).astype(np.int8)
+    else:
+        data = unit.astype(dtype)
+    return _HEADER.pack(_MAGIC, code, norm, scale) + data.tobytes()
+
+
+def is_encoded(value) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview)) and len(value) >= _HEADER.size and bytes(value[:3]) == _MAGIC
+
+
+def decode_raw(blob) -> tuple:
+    """Zero-copy view of a blob: (stored array, scale, norm). The array aliases the blob's memory."""
+    _, code, norm, scale = _HEADER.unpack_from(blob)
+    return np.frombuffer(blob, dtype=_DTYPES[code], offset=_HEADER.size), scale, norm
+
+
+def decode(blob, restore_norm: bool = True) -> np.ndarray:
+    """Decode a blob into a float32 vector; without restore_norm the result is unit length."""
+    data, scale, norm = decode_raw(blob)
+    vector = data.astype(np.float32)
+    if scale != 1.0:
+        vector *= scale
+    if restore_norm:
+        vector *= norm
+    return vector
+
+
+def as_vector(value) -> Optional[np.ndarray]:
+    """Embedding as a float32 array, whether stored as a blob, a raw float32 buffer or a list."""
+    if value is None:
+        return None
+    if is_encoded(value):
+        return decode(value, restore_norm=False)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def to_list(value) -> Optional[list]:
+    """Embedding as a plain list of floats at its original scale, for API responses."""
+    if value is None:
+        return None
+    if is_encoded(value):
+        return decode(value).tolist()
+    return as_vector(value).tolist()
@@ -0,0 +1,86 @@
+import asyncio
+import os
+from typing import Callable, List, Optional, Tuple
+from utils import embed_texts
+
+# How long to wait for concurrent requests to join a batch
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "250"))
+
+
+class EmbeddingBatcher:
+    """Collects concurrent embedding requests and sends them as one batched call.
+
+    The blocking embedding client runs in a worker thread so the event loop
+    keeps serving other requests during the round-trip.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]],
+                 window: float = 0.005, max_batch: int = 250):
+        self.embed_fn = embed_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts, sharing batches with any other concurrent callers."""
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._pending.append((text, future))
+            futures.append(future)
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return list(await asyncio.gather(*futures))
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed a single text."""
+        return (await self.embed_many([text]))[0]
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            self._pending = self._pending[self.max_batch:]
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            vectors = await asyncio.to_thread(self.embed_fn, [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+
+embedding_batcher = EmbeddingBatcher(
+    embed_texts,
+    window=EMBEDDING_BATCH_WINDOW_MS / 1000,
+    max_batch=EMBEDDING_MAX_BATCH,
+)
+
+
+async def embed_text_async(text: str) -> List[float]:
+    """Non-blocking, micro-batched counterpart of utils.embed_text."""
+    return await embedding_batcher.embed(text)
+
+
+async def embed_texts_async(texts: List[str]) -> List[List[float]]:
+    """Non-blocking, micro-batched counterpart of utils.embed_texts."""
+    return await embedding_batcher.embed_many(texts)
@@ -0,0 +1,553 @@
+from google.cloud import firestore
+from google.api_core.exceptions import NotFound
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Any, Callable, Iterator, Tuple
+from utils import parse_json_field, serialize_datetime
+from storage import SolutionStore, QuestionStore, InventoryStore
+from embedding_codec import encode, is_encoded, to_list
+from ttl_cache import TTLCache
+import os
+import json
+import threading
+
+db = None
+
+# Read-through cache for solution and inventory documents (0 disables it)
+DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", "1000"))
+DOCUMENT_CACHE_TTL_SECONDS = float(os.getenv("DOCUMENT_CACHE_TTL_SECONDS", "30"))
+
+_db_lock = threading.Lock()
+
+def get_db():
+    """Return the Firestore client, creating it on first use"""
+    global db
+    if db is None:
+        with _db_lock:
+            if db is None:
+                project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+                db = firestore.Client(project=project_id, database="verifixdb")
+    return db
+
+def init():
+    """Initialize Firestore connection"""
+    get_db()
+
+def paged_query(collection, limit: Optional[int] = None, after: Optional[str] = None, fields: Optional[List[str]] = None):
+    """Build a newest-first query over a collection, starting after the document with ID `after`.
+
+    Without `limit` and `after` the whole collection is streamed unordered.
+    Raises ValueError if the cursor document does not exist.
+    """
+    query = collection
+    if limit is not None or after:
+        query = query.order_by('created_at', direction=firestore.Query.DESCENDING)
+        if after:
+            cursor = collection.document(after).get()
+            if not cursor.exists:
+                raise ValueError(f"Invalid cursor: {after}")
+            query = query.start_after(cursor)
+        if limit is not None:
+            query = query.limit(limit)
+    if fields is not None:
+        query = query.select(fields)
+    return query
+
+def get_documents(refs: List[Any]) -> Dict[str, Any]:
+    """Fetch document snapshots in a single batched read, keyed by document path"""
+    if not refs:
+        return {}
+    return {doc.reference.path: doc for doc in get_db().get_all(refs)}
+
+def cached_get_many(cache: TTLCache, collection, ids: List[str],
+                    from_snapshot: Callable[[Any], Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Serve documents from the cache, fetching all misses in one batched read"""
+    found = {}
+    missing = []
+    for doc_id in ids:
+        cached = cache.get(doc_id)
+        if cached is not None:
+            found[doc_id] = dict(cached)
+        elif doc_id not in missing:
+            missing.append(doc_id)
+
+    docs = get_documents([collection.document(doc_id) for doc_id in missing])
+    for doc in docs.values():
+        data = from_snapshot(doc)
+        if data:
+            cache.set(data['id'], dict(data))
+            found[data['id']] = data
+
+    return [found[doc_id] for doc_id in ids if doc_id in found]
+
+class FirestoreSolution(SolutionStore):
+    def __init__(self):
+        self.cache = TTLCache(DOCUMENT_CACHE_SIZE, DOCUMENT_CACHE_TTL_SECONDS)
+
+    @property
+    def collection(self):
+        # The client is only created when a store is first used
+        return get_db().collection('solutions')
+
+    def create(self, solution_data: Dict[str, Any]) -> str:
+        """Create a new solution document"""
+        # Add timestamps
+        solution_data['created_at'] = datetime.utcnow()
+        solution_data['updated_at'] = datetime.utcnow()
+
+        # Convert any None values to empty strings for Firestore
+        for key, value in solution_data.items():
+            if value is None:
+                solution_data[key] = ""
+            elif isinstance(value, list):
+                solution_data[key] = json.dumps(value)
+
+        # Add the document to Firestore
+        doc_ref = self.collection.document()
+        doc_ref.set(solution_data)
+        self.cache.invalidate(doc_ref.id)
+        return doc_ref.id
+
+    def _from_snapshot(self, doc) -> Optional[Dict[str, Any]]:
+        if doc is None or not doc.exists:
+            return None
+        data = doc.to_dict()
+        data['id'] = doc.id
+        data['solution_steps'] = parse_json_field(data, 'solution_steps')
+        data['tags'] = parse_json_field(data, 'tags')
+        return serialize_datetime(data)
+
+    def _remember(self, solution: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if solution:
+            self.cache.set(solution['id'], dict(solution))
+        return solution
+
+    def invalidate(self, solution_id: str):
+        """Drop a solution from the read cache"""
+        self.cache.invalidate(solution_id)
+
+    def get(self, solution_id: str) -> Optional[Dict[str, Any]]:
+        """Get a solution by ID"""
+        cached = self.cache.get(solution_id)
+        if cached is not None:
+            return dict(cached)
+        return self._remember(self._from_snapshot(self.collection.document(solution_id).get()))
+
+    def get_many(self, solution_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get multiple solutions in one batched read, in the order requested"""
+        return cached_get_many(self.cache, self.collection, solution_ids, self._from_snapshot)
+
+    def iter_page(self, limit: Optional[int] = None, after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stream solutions newest first, optionally starting after a cursor ID"""
+        for doc in paged_query(self.collection, limit, after).stream():
+            data = doc.to_dict()
+            data['id'] = doc.id
+            data['solution_steps'] = parse_json_field(data, 'solution_steps')
+            data['tags'] = parse_json_field(data, 'tags')
+            yield serialize_datetime(data)
+
+    def list_recent(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get most recent solutions"""
+        docs = (self.collection
+               .order_by('created_at', direction=firestore.Query.DESCENDING)
+               .limit(limit)
+               .stream())
+
+        solutions = []
+        for doc in docs:
+            data = doc.to_dict()
+            data['id'] = doc.id
+            data['solution_steps'] = parse_json_field(data, 'solution_steps')
+            data['tags'] = parse_json_field(data, 'tags')
+            solutions.append(serialize_datetime(data))
+        return solutions
+
+    def _prepare_update(self, solution_data: Dict[str, Any]) -> Dict[str, Any]:
+        solution_data['updated_at'] = datetime.utcnow()
+
+        # Convert lists to JSON strings for storage
+        for field in ['solution_steps', 'tags']:
+            if field in solution_data and isinstance(solution_data[field], list):
+                solution_data[field] = json.dumps(solution_data[field])
+        return solution_data
+
+    def update(self, solution_id: str, solution_data: Dict[str, Any]) -> bool:
+        """Update a solution"""
+        # Firestore rejects updates to missing documents, so no read is needed first
+        try:
+            self.collection.document(solution_id).update(self._prepare_update(solution_data))
+            return True
+        except NotFound:
+            return False
+        finally:
+            self.cache.invalidate(solution_id)
+
+    def list_by_status(self, statuses: List[str]) -> List[Dict[str, Any]]:
+        """Get all solutions whose status is one of the given values"""
+        query = self.collection.where(filter=firestore.FieldFilter('status', 'in', statuses))
+        return [self._from_snapshot(doc) for doc in query.stream()]
+
+    def find_active_by_key(self, question_key: str, statuses: List[str]) -> Optional[str]:
+        """Get the ID of a live solution for the same normalized question that is still in one of the given statuses.
+
+        Solutions past `queued` whose lease has expired were left behind by a
+        worker that died and are skipped.
+        """
+        query = (self.collection
+                 .where(filter=firestore.FieldFilter('question_key', '==', question_key))
+                 .where(filter=firestore.FieldFilter('status', 'in', statuses))
+                 .select(['status', 'lease_expires_at']))
+        now = datetime.now(timezone.utc)
+        for doc in query.stream():
+            data = doc.to_dict()
+            lease_expires_at = data.get('lease_expires_at')
+            if data.get('status') == 'queued' or (lease_expires_at and lease_expires_at > now):
+                return doc.id
+        return None
+
+    def claim(self, solution_id: str, owner: str, lease_seconds: float, active_statuses: List[str]) -> bool:
+        """Take a time-limited lease on an active solution for a worker.
+
+        Fails if the solution is missing, no longer active, or leased by
+        another worker whose lease has not expired yet.
+        """
+        doc_ref = self.collection.document(solution_id)
+
+        @firestore.transactional
+        def claim_in_transaction(transaction) -> bool:
+            doc = doc_ref.get(transaction=transaction)
+            if not doc.exists:
+                return False
+            data = doc.to_dict()
+            if data.get('status') not in active_statuses:
+                return False
+
+            now = datetime.now(timezone.utc)
+            lease_owner = data.get('lease_owner')
+            lease_expires_at = data.get('lease_expires_at')
+            if lease_owner and lease_owner != owner and lease_expires_at and lease_expires_at > now:
+                return False
+
+            transaction.update(doc_ref, {
+                'lease_owner': owner,
+                'lease_expires_at': now + timedelta(seconds=lease_seconds),
+            })
+            return True
+
+        try:
+            return claim_in_transaction(get_db().transaction())
+        finally:
+            self.cache.invalidate(solution_id)
+
+    def renew_lease(self, solution_id: str, owner: str, lease_seconds: float):
+        """Extend a worker's lease on a solution"""
+        self.collection.document(solution_id).update({
+            'lease_owner': owner,
+            'lease_expires_at': datetime.now(timezone.utc) + timedelta(seconds=lease_seconds),
+        })
+
+    def watch(self, solution_id: str, callback: Callable[[Optional[Dict[str, Any]]], None]) -> Callable[[], None]:
+        """Listen for changes to a solution document.
+
+        `callback` is invoked from a Firestore background thread with the raw
+        document data (None if the document does not exist). Returns a function
+        that stops the listener.
+        """
+        def on_snapshot(doc_snapshots, changes, read_time):
+            for doc in doc_snapshots:
+                callback(doc.to_dict() if doc.exists else None)
+
+        watch = self.collection.document(solution_id).on_snapshot(on_snapshot)
+        return watch.unsubscribe
+
+    def delete(self, solution_id: str) -> bool:
+        """Delete a solution by ID"""
+        try:
+            self.collection.document(solution_id).delete()
+            self.cache.invalidate(solution_id)
+            return True
+        except Exception as e:
+            print(f"Error deleting solution: {str(e)}")
+            return False
+
+class FirestoreQuestion(QuestionStore):
+    def __init__(self, solution_store: Optional[SolutionStore] = None):
+        super().__init__(solution_store)
+
+    @property
+    def collection(self):
+        return get_db().collection('questions')
+
+    def _prepare_create(self, question_data: Dict[str, Any]) -> Dict[str, Any]:
+        # Store the embedding as a compact blob rather than an array of doubles
+        if question_data.get('embedding') is not None:
+            question_data['embedding'] = encode(question_data['embedding'])
+
+        return {
+            **question_data,
+            'created_at': datetime.utcnow(),
+            'updated_at': datetime.utcnow(),
+        }
+
+    def create(self, question_data: Dict[str, Any]) -> str:
+        """Create a new question document with embedding"""
+        doc_ref = self.collection.document()
+        document = self._prepare_create(question_data)
+        doc_ref.set(document)
+        self._on_created(doc_ref.id, document)
+        return doc_ref.id
+
+    def get(self, question_id: str) -> Optional[Dict[str, Any]]:
+        """Get a question by ID"""
+        doc_ref = self.collection.document(question_id)
+        doc = doc_ref.get()
+        if doc.exists:
+            return self._from_snapshot(doc)
+        return None
+
+    def _from_snapshot(self, doc) -> Dict[str, Any]:
+        data = doc.to_dict()
+        data['id'] = doc.id
+        if 'embedding' in data:
+            data['embedding'] = to_list(data['embedding'])
+        return serialize_datetime(data)
+
+    def iter_page(self, limit: Optional[int] = None, after: Optional[str] = None,
+                  include_embedding: bool = False) -> Iterator[Dict[str, Any]]:
+        """Stream questions newest first; embeddings are only read when requested"""
+        fields = None if include_embedding else self.SUMMARY_FIELDS
+        for doc in paged_query(self.collection, limit, after, fields).stream():
+            yield self._from_snapshot(doc)
+
+    def _iter_embeddings(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for doc in self.collection.stream():
+            yield doc.id, doc.to_dict()
+
+    def _watch_questions(self, since: datetime) -> Callable[[], None]:
+        """Listen for questions created since `since`, so writes from other instances reach the index.
+
+        Runs on a Firestore background thread; this instance's own writes
+        arrive here too and are re-indexed idempotently.
+        """
+        def on_snapshot(doc_snapshots, changes, read_time):
+            for change in changes:
+                try:
+                    if change.type.name == 'REMOVED':
+                        self._on_removed(change.document.id)
+                    else:
+                        self._on_changed(change.document.id, change.document.to_dict())
+                except Exception as e:
+                    print(f"Error applying question change {change.document.id}: {str(e)}")
+
+        query = self.collection.where(filter=firestore.FieldFilter('created_at', '>=', since))
+        return query.on_snapshot(on_snapshot).unsubscribe
+
+    def migrate_embeddings(self, storage_format: Optional[str] = None) -> Dict[str, int]:
+        """Rewrite embeddings stored as arrays of doubles as compact blobs, in batched writes"""
+        migrated = skipped = 0
+        batch, pending = get_db().batch(), 0
+        for doc in self.collection.select(['embedding']).stream():
+            embedding = (doc.to_dict() or {}).get('embedding')
+            if embedding is None or is_encoded(embedding):
+                skipped += 1
+                continue
+            batch.update(doc.reference, {'embedding': encode(embedding, storage_format)})
+            pending += 1
+            if pending == MAX_BATCH_WRITES:
+                batch.commit()
+                migrated += pending
+                batch, pending = get_db().batch(), 0
+        if pending:
+            batch.commit()
+            migrated += pending
+        return {'migrated': migrated, 'skipped': skipped}
+
+    def find_by_solution(self, solution_id: str) -> List[str]:
+        """Get the IDs of the questions linked to a solution"""
+        query = (self.collection
+                 .where(filter=firestore.FieldFilter('solution_id', '==', solution_id))
+                 .select([]))
+        return [doc.id for doc in query.stream()]
+
+    def delete(self, question_id: str) -> bool:
+        """Delete a question by ID"""
+        try:
+            self.collection.document(question_id).delete()
+            self.index.remove(question_id)
+            self.lexical.remove(question_id)
+            return True
+        except Exception as e:
+            print(f"Error deleting question: {str(e)}")
+            return False
+
+class FirestoreInventory(InventoryStore):
+    def __init__(self):
+        self.cache = TTLCache(DOCUMENT_CACHE_SIZE, DOCUMENT_CACHE_TTL_SECONDS)
+
+    @property
+    def collection(self):
+        return get_db().collection('inventory')
+
+    def _prepare_create(self, inventory_data: Dict[str, Any]) -> Dict[str, Any]:
+        # Add timestamps
+        inventory_data['created_at'] = datetime.utcnow()
+        inventory_data['updated_at'] = datetime.utcnow()
+        return inventory_data
+
+    def create(self, inventory_data: Dict[str, Any]) -> str:
+        """Create a new inventory document"""
+        # Add the document to Firestore
+        doc_ref = self.collection.document()
+        doc_ref.set(self._prepare_create(inventory_data))
+        self.cache.invalidate(doc_ref.id)
+        return doc_ref.id
+
+    def _from_snapshot(self, doc) -> Optional[Dict[str, Any]]:
+        if doc is None or not doc.exists:
+            return None
+        data = doc.to_dict()
+        data['id'] = doc.id
+        return serialize_datetime(data)
+
+    def _remember(self, inventory_item: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if inventory_item:
+            self.cache.set(inventory_item['id'], dict(inventory_item))
+        return inventory_item
+
+    def invalidate(self, inventory_id: str):
+        """Drop an inventory item from the read cache"""
+        self.cache.invalidate(inventory_id)
+
+    def get(self, inventory_id: str) -> Optional[Dict[str, Any]]:
+        """Get an inventory item by ID"""
+        cached = self.cache.get(inventory_id)
+        if cached is not None:
+            return dict(cached)
+        return self._remember(self._from_snapshot(self.collection.document(inventory_id).get()))
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        """Get all inventory items"""
+        docs = self.collection.stream()
+        return [serialize_datetime({**doc.to_dict(), 'id': doc.id}) for doc in docs]
+
+    def get_multiple(self, inventory_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get multiple inventory items by their IDs in one batched read"""
+        return cached_get_many(self.cache, self.collection, inventory_ids, self._from_snapshot)
+
+    def delete(self, inventory_id: str) -> bool:
+        """Delete an inventory item by ID"""
+        try:
+            self.collection.document(inventory_id).delete()
+            self.cache.invalidate(inventory_id)
+            return True
+        except Exception as e:
+            print(f"Error deleting inventory item: {str(e)}")
+            return False
+
+# Firestore allows at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+
+def delete_in_batches(refs_to_delete: List[Any]):
+    """Delete document references using as few batched writes as possible"""
+    for start in range(0, len(refs_to_delete), MAX_BATCH_WRITES):
+        batch = get_db().batch()
+        for ref in refs_to_delete[start:start + MAX_BATCH_WRITES]:
+            batch.delete(ref)
+        batch.commit()
+
+def delete_solution_cascade(solution_id: str, inventory_id: Optional[str] = None) -> bool:
+    """Delete a solution together with its inventory item and questions"""
+    try:
+        question_ids = questions.find_by_solution(solution_id)
+        refs = [questions.collection.document(question_id) for question_id in question_ids]
+        if inventory_id:
+            refs.append(inventory.collection.document(inventory_id))
+        # The solution goes last so a partial failure never leaves orphaned questions behind it
+        refs.append(solutions.collection.document(solution_id))
+        delete_in_batches(refs)
+    except Exception as e:
+        print(f"Error deleting solution {solution_id}: {str(e)}")
+        return False
+    finally:
+        solutions.invalidate(solution_id)
+        if inventory_id:
+            inventory.invalidate(inventory_id)
+
+    for question_id in question_ids:
+        questions.index.remove(question_id)
+        questions.lexical.remove(question_id)
+    return True
+
+def commit_investigation(solution_id: str, solution_data: Dict[str, Any],
+                         inventory_data: Dict[str, Any], question_data: Dict[str, Any]) -> Tuple[str, str]:
+    """Atomically store the results of an investigation.
+
+    Creates the inventory item and the question (linked to both the solution
+    and the inventory item) and updates the solution, all in one batched write.
+    Returns the new inventory and question IDs.
+    """
+    # Keying the inventory item by solution ID lets readers fetch both in one batched read
+    inventory_ref = inventory.collection.document(solution_id)
+    question_ref = questions.collection.document()
+
+    solution_data['inventory_id'] = inventory_ref.id
+    question_document = questions._prepare_create({
+        **question_data,
+        'solution_id': solution_id,
+        'inventory_id': inventory_ref.id,
+    })
+
+    batch = get_db().batch()
+    batch.set(inventory_ref, inventory._prepare_create(inventory_data))
+    batch.set(question_ref, question_document)
+    batch.update(solutions.collection.document(solution_id), solutions._prepare_update(solution_data))
+    batch.commit()
+    solutions.invalidate(solution_id)
+    inventory.invalidate(inventory_ref.id)
+
+    questions._on_created(question_ref.id, question_document, solution_data)
+    return inventory_ref.id, question_ref.id
+
+def get_solution_with_inventory(solution_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Get a solution and its inventory item.
+
+    Investigations store their inventory item under the solution's ID, so both
+    come back from one batched read. Older solutions whose inventory item has
+    a different ID need a second read.
+    """
+    cached = solutions.cache.get(solution_id)
+    if cached is not None:
+        solution = dict(cached)
+        inventory_id = solution.get('inventory_id')
+        return solution, inventory.get(inventory_id) if inventory_id else None
+
+    solution_ref = solutions.collection.document(solution_id)
+    inventory_ref = inventory.collection.document(solution_id)
+    docs = get_documents([solution_ref, inventory_ref])
+
+    solution = solutions._remember(solutions._from_snapshot(docs.get(solution_ref.path)))
+    inventory_id = solution.get('inventory_id') if solution else None
+    if not inventory_id:
+        return solution, None
+    if inventory_id == solution_id:
+        return solution, inventory._remember(inventory._from_snapshot(docs.get(inventory_ref.path)))
+    return solution, inventory.get(inventory_id)
+
+def attach_inventory(solution_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Add each solution's inventory item under 'inventory', using one batched read"""
+    inventory_ids = list({solution['inventory_id'] for solution in solution_list if solution.get('inventory_id')})
+    items = {item['id']: item for item in inventory.get_multiple(inventory_ids)}
+    for solution in solution_list:
+        solution['inventory'] = items.get(solution.get('inventory_id'))
+    return solution_list
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the document read caches"""
+    return {
+        'solutions': solutions.cache.stats(),
+        'inventory': inventory.cache.stats(),
+    }
+
+# Create instances for global use
+solutions = FirestoreSolution()
+questions = FirestoreQuestion(solutions)
+inventory = FirestoreInventory()
\ No newline at end of file
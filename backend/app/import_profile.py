@@ -0,0 +1,73 @@
+"""Import-time profiling for tracking startup cost.
+
+With IMPORT_PROFILE set, main.py calls `install()` before importing the
+application and `report()` afterwards, which prints the slowest modules by
+self time (excluding their own imports) and by cumulative time.
+"""
+import importlib.abc
+import sys
+import time
+from typing import Dict, List
+
+IMPORT_PROFILE_TOP = 25
+
+_cumulative: Dict[str, float] = {}
+_self: Dict[str, float] = {}
+_stack: List[List[float]] = []
+_started = None
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader):
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        name = module.__name__
+        _stack.append([0.0])
+        started = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = _stack.pop()[0]
+            _cumulative[name] = elapsed
+            _self[name] = elapsed - children
+            if _stack:
+                _stack[-1][0] += elapsed
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class _TimedFinder(importlib.abc.MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+def install():
+    """Start timing every module imported from now on."""
+    global _started
+    _started = time.perf_counter()
+    sys.meta_path.insert(0, _TimedFinder())
+
+
+def report(top: int = IMPORT_PROFILE_TOP):
+    """Print total import time and the slowest modules."""
+    if _started is None:
+        return
+    print(f"Import profile: {time.perf_counter() - _started:.3f}s total, {len(_cumulative)} modules")
+    for title, timings in (("self", _self), ("cumulative", _cumulative)):
+        print(f"  slowest by {title} time:")
+        for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f"    {seconds * 1000:9.1f} ms  {name}")
@@ -0,0 +1,217 @@
+import asyncio
+import os
+import socket
+import uuid
+from typing import Dict, List, Optional, Tuple
+from db import solutions
+from similarity_index import SimilarityIndex
+from services.research_service import process_research_report, update_status
+from llm_scheduler import llm_priority, BACKGROUND
+
+# Maximum number of research runs executing at once in this process
+INVESTIGATION_CONCURRENCY = int(os.getenv("INVESTIGATION_CONCURRENCY", "2"))
+# Maximum number of investigations waiting for a worker before /investigate returns 429
+INVESTIGATION_QUEUE_SIZE = int(os.getenv("INVESTIGATION_QUEUE_SIZE", "20"))
+# How long a worker owns an investigation without renewing its lease
+INVESTIGATION_LEASE_SECONDS = float(os.getenv("INVESTIGATION_LEASE_SECONDS", "120"))
+# Questions at least this similar to an in-flight investigation attach to it instead
+INVESTIGATION_DEDUP_THRESHOLD = float(os.getenv("INVESTIGATION_DEDUP_THRESHOLD", "0.95"))
+
+# Statuses of investigations that have not finished yet
+ACTIVE_STATUSES = ['queued', 'analyzing', 'processing', 'identifying', 'validating', 'storing']
+
+
+def _import_researcher():
+    from gpt_researcher import GPTResearcher
+    return GPTResearcher
+
+
+class QueueFullError(Exception):
+    """Raised when the investigation queue has no room for another job."""
+
+
+class InvestigationQueue:
+    """Bounded-concurrency worker pool for research investigations.
+
+    The solution document is the durable job record: it is created with status
+    `queued` and its title is the question to research. Workers claim a lease
+    on the document before running it, so investigations left in an active
+    state by a restarted instance can be recovered without being run twice.
+    """
+
+    def __init__(self, concurrency: int = INVESTIGATION_CONCURRENCY,
+                 max_pending: int = INVESTIGATION_QUEUE_SIZE,
+                 lease_seconds: float = INVESTIGATION_LEASE_SECONDS):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._recovery: Optional[asyncio.Task] = None
+        self._running = 0
+        # In-flight investigations by normalized question, and by embedding
+        self._in_flight_keys: Dict[str, str] = {}
+        self._in_flight_embeddings = SimilarityIndex(initial_capacity=64)
+        # Reservations held while a solution document is being written, resolved with its ID
+        self._reservations: Dict[str, asyncio.Future] = {}
+
+    def full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize() if self._queue else 0,
+            "running": self._running,
+            "concurrency": self.concurrency,
+            "max_pending": self.max_pending,
+            "in_flight": len(self._in_flight_keys),
+        }
+
+    async def start(self):
+        """Start the worker pool and re-enqueue unfinished investigations."""
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        # Held so the task is not garbage collected before it finishes
+        self._recovery = asyncio.create_task(self._recover())
+
+    async def stop(self):
+        tasks = self._workers + ([self._recovery] if self._recovery else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._recovery = None
+
+    def find_in_flight(self, question_key: str, embedding=None) -> Optional[str]:
+        """Return the solution ID of an in-flight investigation of the same question, if any."""
+        if question_key in self._in_flight_keys:
+            return self._in_flight_keys[question_key]
+        if embedding is not None:
+            hits = self._in_flight_embeddings.search(embedding, limit=1, min_score=INVESTIGATION_DEDUP_THRESHOLD)
+            if hits:
+                return hits[0][0]
+        return None
+
+    def _track(self, solution_id: str, question_key: Optional[str], embedding=None):
+        if question_key:
+            self._in_flight_keys[question_key] = solution_id
+        if embedding is not None:
+            self._in_flight_embeddings.add(solution_id, embedding)
+
+    def _untrack(self, solution_id: str):
+        for key in [key for key, value in self._in_flight_keys.items() if value == solution_id]:
+            del self._in_flight_keys[key]
+        self._in_flight_embeddings.remove(solution_id)
+
+    def reserve(self, question_key: str, embedding=None) -> str:
+        """Register a question as in flight before its solution document exists.
+
+        Identical requests arriving while the document is written find the
+        returned reservation ID and wait for it in `resolve`. Pass it to
+        `submit`, and always `release` it afterwards.
+        """
+        reservation = f"pending-{uuid.uuid4().hex}"
+        self._reservations[reservation] = asyncio.get_running_loop().create_future()
+        self._track(reservation, question_key, embedding)
+        return reservation
+
+    def release(self, reservation: str):
+        """Drop a reservation; waiters get None unless `submit` resolved it."""
+        self._untrack(reservation)
+        future = self._reservations.pop(reservation, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def resolve(self, solution_id: str) -> Optional[str]:
+        """The solution ID for an ID from `find_in_flight`, waiting out a reservation."""
+        future = self._reservations.get(solution_id)
+        if future is None:
+            return solution_id
+        return await asyncio.shield(future)
+
+    def submit(self, solution_id: str, question: str, question_key: Optional[str] = None, embedding=None,
+               reservation: Optional[str] = None):
+        """Enqueue an investigation, raising QueueFullError if there is no room.
+
+        `question_key` and `embedding` register the investigation for
+        deduplication until it finishes, replacing `reservation` if given.
+        """
+        if self._queue is None:
+            raise RuntimeError("Investigation queue has not been started")
+        try:
+            self._queue.put_nowait((solution_id, question))
+        except asyncio.QueueFull:
+            raise QueueFullError("Too many investigations in progress, please try again later")
+        self._track(solution_id, question_key, embedding)
+        if reservation is not None:
+            self._untrack(reservation)
+            future = self._reservations.pop(reservation, None)
+            if future is not None and not future.done():
+                future.set_result(solution_id)
+
+    async def _recover(self):
+        try:
+            pending = await asyncio.to_thread(solutions.list_by_status, ACTIVE_STATUSES)
+        except Exception as e:
+            print(f"Error recovering investigations: {str(e)}")
+            return
+
+        print(f"Recovering {len(pending)} unfinished investigations")
+        for solution in pending:
+            self._track(solution['id'], solution.get('question_key'))
+            # Wait for room rather than dropping recovered work
+            await self._queue.put((solution['id'], solution.get('title', '')))
+
+    async def _renew_lease(self, solution_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(solutions.renew_lease, solution_id, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"Error renewing lease for {solution_id}: {str(e)}")
+
+    async def _run(self, job: Tuple[str, str]):
+        solution_id, question = job
+        claimed = await asyncio.to_thread(
+            solutions.claim, solution_id, self.worker_id, self.lease_seconds, ACTIVE_STATUSES
+        )
+        if not claimed:
+            # Finished already, deleted, or owned by a live worker elsewhere
+            return
+
+        heartbeat = asyncio.create_task(self._renew_lease(solution_id))
+        # Research and extraction calls yield to interactive requests
+        priority = llm_priority.set(BACKGROUND)
+        try:
+            try:
+                # Imported on first use in a worker thread: gpt_researcher pulls in
+                # langchain and would block the event loop for the whole import
+                researcher_class = await asyncio.to_thread(_import_researcher)
+                researcher = researcher_class(question, "research_report")
+            except Exception as e:
+                await asyncio.to_thread(update_status, solution_id, 'error', {
+                    'text': f"Failed to initialize researcher: {str(e)}",
+                    'error': True
+                })
+                return
+            await process_research_report(question, researcher, solution_id)
+        finally:
+            llm_priority.reset(priority)
+            heartbeat.cancel()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._running += 1
+            try:
+                await self._run(job)
+            except Exception as e:
+                print(f"Error running investigation {job[0]}: {str(e)}")
+            finally:
+                self._running -= 1
+                self._untrack(job[0])
+                self._queue.task_done()
+
+
+investigation_queue = InvestigationQueue()
@@ -0,0 +1,114 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Runs of letters, digits, dots and hyphens, so error codes (E5023), model
+# numbers (S7-1500) and firmware versions (v2.1.3) stay single tokens
+_TOKEN = re.compile(r"[\w][\w.\-]*[\w]|[\w]")
+_SPLIT = re.compile(r"[.\-]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of a text; compound tokens also yield their parts."""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        terms.append(token)
+        parts = [part for part in _SPLIT.split(token) if part]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index.
+
+    Scores are normalized by the score of an average-length document holding
+    every query term once and capped at 1, so they measure how much of the
+    query's IDF-weighted vocabulary a document contains, independent of corpus
+    size.
+
+    Terms found in more than `common_fraction` of the documents (and in at
+    least `common_min_docs`) carry little IDF, and walking their postings
+    would make every query linear in the corpus. They are only scored for
+    the caller's candidate documents; rarer terms are scored for every
+    document that contains them.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, common_fraction: float = 0.05,
+                 common_min_docs: int = 100):
+        self.k1 = k1
+        self.b = b
+        self.common_fraction = common_fraction
+        self.common_min_docs = common_min_docs
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, List[str]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, doc_id: str, texts: Iterable[str]):
+        """Index a document made of several text fields, replacing any earlier version."""
+        counts = Counter(term for text in texts if text for term in tokenize(text))
+        with self._lock:
+            self.remove(doc_id)
+            for term, count in counts.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+            length = sum(counts.values())
+            self._lengths[doc_id] = length
+            self._terms[doc_id] = list(counts)
+            self._total_length += length
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            length = self._lengths.pop(doc_id, None)
+            if length is None:
+                return False
+            self._total_length -= length
+            for term in self._terms.pop(doc_id):
+                del self._postings[term][doc_id]
+                if not self._postings[term]:
+                    del self._postings[term]
+            return True
+
+    def search(self, query: str, limit: int = 10,
+               candidates: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Return up to `limit` (doc_id, normalized score) pairs, highest first.
+
+        `candidates` are documents (e.g. the vector search hits) that common
+        query terms are scored for; without it common terms only count
+        towards the normalization.
+        """
+        terms = set(tokenize(query))
+        candidates = list(candidates or ())
+        with self._lock:
+            count = len(self._lengths)
+            if not terms or count == 0 or limit <= 0:
+                return []
+
+            average_length = self._total_length / count or 1.0
+            common_docs = max(self.common_min_docs, self.common_fraction * count)
+            scores: Dict[str, float] = {}
+            best_possible = 0.0
+            for term in terms:
+                docs = self._postings.get(term, {})
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                # Unmatched terms count too, so a partial match scores below 1
+                best_possible += idf
+                if len(docs) > common_docs:
+                    matched = [(doc_id, docs[doc_id]) for doc_id in candidates if doc_id in docs]
+                else:
+                    matched = docs.items()
+                for doc_id, frequency in matched:
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            if not scores:
+                return []
+            ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [(doc_id, min(score / best_possible, 1.0)) for doc_id, score in ranked]
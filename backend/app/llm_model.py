@@ -1,36 +1,115 @@
-from google import genai
-from google.genai import types
 import base64
+import os
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, Union
+from metrics import LLM_REQUEST_SECONDS, record_usage, timed
+from llm_scheduler import llm_scheduler, retry_reason
+from utils import estimate_tokens
 
-async def generate_response(query: str, image_data: str = None):
-    client = genai.Client(
-        vertexai=True,
-        project="even-hull-461009-j8",
-        location="global",
-    )
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-preview-05-20")
+GEMINI_PROJECT = os.getenv("GEMINI_PROJECT", os.getenv("GOOGLE_CLOUD_PROJECT"))
+GEMINI_LOCATION = os.getenv("GEMINI_LOCATION", "global")
+# Profiles with a thinking budget turn thinking off for short answers; not every model allows that.
+# When false those profiles keep their temperature but not their output cap
+GEMINI_PROFILE_THINKING = os.getenv("GEMINI_PROFILE_THINKING", "true").lower() in ("1", "true", "yes")
+# Upload long shared context (the research report) once as cached content for the follow-up prompts.
+# Vertex AI context caching needs a regional endpoint, so it stays off with GEMINI_LOCATION=global
+CONTEXT_CACHE_ENABLED = (os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+                         and GEMINI_LOCATION != "global")
+# Gemini rejects caches below a model-specific minimum size; shorter contexts are sent inline
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "2048"))
+# Caches are deleted after use; the TTL only bounds a cache orphaned by a crash
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "600"))
+# Stands in for the cached text in prompts that refer to it
+CACHED_CONTEXT_PLACEHOLDER = "[Provided above as cached context.]"
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """Generation settings for one kind of prompt."""
+    max_output_tokens: int = 65535
+    temperature: float = 1.0
+    json: bool = False
+    thinking_budget: Optional[int] = None
+
+
+DEFAULT_PROFILE = GenerationProfile()
+_SHORT_FIELD = GenerationProfile(max_output_tokens=256, temperature=0, thinking_budget=0)
+_JSON_LIST = GenerationProfile(max_output_tokens=4096, temperature=0, json=True, thinking_budget=0)
 
-    model = "gemini-2.5-flash-preview-05-20"
+# Profile per prompt kind; kinds not listed use DEFAULT_PROFILE
+GENERATION_PROFILES = {
+    "prepare_question": GenerationProfile(max_output_tokens=256, temperature=0.2, thinking_budget=0),
+    "image_analysis": GenerationProfile(max_output_tokens=4096, temperature=0.4),
+    "chat": GenerationProfile(max_output_tokens=8192, temperature=0.7),
+    "confidence": GenerationProfile(max_output_tokens=16, temperature=0, thinking_budget=0),
+    "inventory": GenerationProfile(max_output_tokens=4096, temperature=0, json=True, thinking_budget=0),
+    "extract_structured": GenerationProfile(max_output_tokens=16384, temperature=0, json=True),
+    "extract_description": GenerationProfile(max_output_tokens=2048, temperature=0.2, thinking_budget=0),
+    "extract_solution_steps": _JSON_LIST,
+    "extract_links": _JSON_LIST,
+    "extract_manufacturer": _SHORT_FIELD,
+    "extract_machine_name": _SHORT_FIELD,
+    "extract_model_number": _SHORT_FIELD,
+    "extract_error_code": _SHORT_FIELD,
+    "extract_component": _SHORT_FIELD,
+    "extract_resolution_type": _SHORT_FIELD,
+    "extract_downtime_impact": _SHORT_FIELD,
+}
 
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the process-wide Gemini client, creating it on first use.
+
+    Reusing one client keeps its credentials and HTTP connection pool warm
+    across requests. The SDK itself is imported here to keep it off the
+    startup path.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+                _client = genai.Client(
+                    vertexai=True,
+                    project=GEMINI_PROJECT,
+                    location=GEMINI_LOCATION,
+                )
+    return _client
+
+def _build_contents(query: str, image_data: Union[str, bytes] = None, image_mime_type: str = "image/jpeg"):
+    from google.genai import types
     parts = [types.Part(text=query)]
     if image_data:
-        # Assuming image_data is a base64 encoded string
+        # image_data is either raw bytes or a base64 encoded string
         parts.append(types.Part(inline_data=types.Blob(
-            mime_type="image/jpeg",
-            data=base64.b64decode(image_data)
+            mime_type=image_mime_type,
+            data=image_data if isinstance(image_data, bytes) else base64.b64decode(image_data)
         )))
 
-    contents = [
+    return [
         types.Content(
             role="user",
             parts=parts
         )
     ]
 
+def _build_config(response_schema: dict = None, profile: GenerationProfile = DEFAULT_PROFILE,
+                  cached_content: str = None):
+    from google.genai import types
+    max_output_tokens = profile.max_output_tokens
+    if profile.thinking_budget is not None and not GEMINI_PROFILE_THINKING:
+        # Tight caps assume thinking is off; with thinking on, they would be spent on thoughts
+        max_output_tokens = DEFAULT_PROFILE.max_output_tokens
     generate_content_config = types.GenerateContentConfig(
-        temperature=1,
+        temperature=profile.temperature,
         top_p=1,
         seed=0,
-        max_output_tokens=65535,
+        max_output_tokens=max_output_tokens,
         safety_settings=[types.SafetySetting(
             category="HARM_CATEGORY_HATE_SPEECH",
             threshold="OFF"
@@ -45,10 +124,102 @@ async def generate_response(query: str, image_data: str = None):
             threshold="OFF"
         )],
     )
+    if profile.thinking_budget is not None and GEMINI_PROFILE_THINKING:
+        generate_content_config.thinking_config = types.ThinkingConfig(thinking_budget=profile.thinking_budget)
+    if response_schema or profile.json:
+        generate_content_config.response_mime_type = "application/json"
+    if response_schema:
+        generate_content_config.response_schema = response_schema
+    if cached_content:
+        generate_content_config.cached_content = cached_content
+    return generate_content_config
+
+def profile_for(kind: str) -> GenerationProfile:
+    return GENERATION_PROFILES.get(kind, DEFAULT_PROFILE)
 
-    response = await client.aio.models.generate_content(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
+async def generate_response(query: str, image_data: Union[str, bytes] = None, response_schema: dict = None,
+                            image_mime_type: str = "image/jpeg", kind: str = "other", cached_content: str = None):
+    """Generate a response for the query.
+
+    When `response_schema` is given the model is asked for JSON output
+    conforming to that (OpenAPI-style) schema. `kind` labels the call's
+    latency and token metrics and selects its generation profile (output
+    token cap, temperature, JSON output). `cached_content` names a context
+    cache from `cached_context` that the prompt refers to. Calls go through
+    the shared scheduler, which limits concurrency, prioritizes interactive
+    requests and retries 429s.
+    """
+    contents = _build_contents(query, image_data, image_mime_type)
+    config = _build_config(response_schema, profile_for(kind), cached_content)
+
+    async def call():
+        with timed(LLM_REQUEST_SECONDS, kind=kind):
+            return await get_client().aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=contents,
+                config=config,
+            )
+
+    response = await llm_scheduler.run(call, kind=kind)
+    record_usage(kind, getattr(response, "usage_metadata", None))
+    # No text (e.g. MAX_TOKENS or a safety block) reads as an empty answer
+    return response.text or ""
+
+async def stream_response(query: str, image_data: str = None, kind: str = "other") -> AsyncIterator[str]:
+    """Generate a response for the query, yielding text chunks as they arrive."""
+    usage_metadata = None
+    # Holds a scheduler slot while streaming; not retried, since text may already have been sent
+    async with llm_scheduler.slot():
+        with timed(LLM_REQUEST_SECONDS, kind=kind):
+            try:
+                stream = await get_client().aio.models.generate_content_stream(
+                    model=GEMINI_MODEL,
+                    contents=_build_contents(query, image_data),
+                    config=_build_config(profile=profile_for(kind)),
+                )
+            except Exception as e:
+                if retry_reason(e) == "rate_limited":
+                    llm_scheduler.decrease()
+                raise
+            async for chunk in stream:
+                # Each chunk carries the running totals; the last one is final
+                usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+                if chunk.text:
+                    yield chunk.text
+    record_usage(kind, usage_metadata)
+
+@asynccontextmanager
+async def cached_context(text: str, kind: str = "context") -> AsyncIterator[Optional[str]]:
+    """Upload `text` once as Gemini cached content for the prompts in the block.
+
+    Yields the cache name to pass as `cached_content`, or None when caching
+    is disabled or unavailable at GEMINI_LOCATION, the text is below the cache minimum, or the upload fails;
+    callers then send the text inline. The cache is deleted on exit.
+    """
+    if not CONTEXT_CACHE_ENABLED or estimate_tokens(text) < CONTEXT_CACHE_MIN_TOKENS:
+        yield None
+        return
+
+    from google.genai import types
+    config = types.CreateCachedContentConfig(
+        contents=[types.Content(role="user", parts=[types.Part(text=text)])],
+        ttl=f"{CONTEXT_CACHE_TTL_SECONDS}s",
+        display_name=kind,
     )
-    return response.text
+    try:
+        cache = await llm_scheduler.run(
+            lambda: get_client().aio.caches.create(model=GEMINI_MODEL, config=config),
+            kind=f"cache_{kind}",
+        )
+    except Exception as e:
+        print(f"Error creating context cache, sending context inline: {str(e)}")
+        yield None
+        return
+
+    try:
+        yield cache.name
+    finally:
+        try:
+            await get_client().aio.caches.delete(name=cache.name)
+        except Exception as e:
+            print(f"Error deleting context cache {cache.name}: {str(e)}")
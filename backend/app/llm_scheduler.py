@@ -0,0 +1,219 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from metrics import LLM_CONCURRENCY_LIMIT, LLM_HEDGES, LLM_RETRIES
+
+# Concurrency limit bounds; the limit adapts between them (AIMD)
+LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", "8"))
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", "32"))
+# A call slower than this multiple of its kind's median latency counts as congestion
+LLM_LATENCY_FACTOR = float(os.getenv("LLM_LATENCY_FACTOR", "3"))
+# Retries with full-jitter exponential backoff for 429s and transient server errors
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "30"))
+# Send a duplicate request when a call runs past its kind's p95 latency
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() in ("1", "true", "yes")
+
+# Lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Priority of LLM calls made from the current task; investigation workers set BACKGROUND
+llm_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+# Latency samples kept per prompt kind, and the number needed before they are used
+_SAMPLE_WINDOW = 200
+_MIN_SAMPLES = 20
+# Minimum seconds between two multiplicative decreases, so one burst of 429s halves the limit once
+_DECREASE_COOLDOWN = 2.0
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for attribute in ("code", "status_code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def retry_reason(error: Exception) -> Optional[str]:
+    """Why an error is worth retrying, or None if it is not."""
+    code = _status_code(error)
+    if code == 429 or "ResourceExhausted" in type(error).__name__:
+        return "rate_limited"
+    if code in (500, 502, 503, 504) or isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return "unavailable"
+    return None
+
+
+class LLMScheduler:
+    """Process-wide admission control for Gemini calls.
+
+    Calls wait for one of `limit` slots, interactive before background. The
+    limit grows by 1/limit per call that completes at normal latency and
+    halves on a 429 or a call far slower than usual. Failed calls are retried
+    with jittered exponential backoff, and with hedging enabled a call running
+    past its p95 gets a duplicate request, the first answer winning.
+    """
+
+    def __init__(self, initial: int = LLM_CONCURRENCY_INITIAL, minimum: int = LLM_CONCURRENCY_MIN,
+                 maximum: int = LLM_CONCURRENCY_MAX, max_retries: int = LLM_MAX_RETRIES,
+                 hedging: bool = LLM_HEDGING):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_retries = max_retries
+        self.hedging = hedging
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._last_decrease = 0.0
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=_SAMPLE_WINDOW))
+        LLM_CONCURRENCY_LIMIT.set(self._limit)
+
+    @property
+    def limit(self) -> int:
+        return max(1, int(self._limit))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "waiting": sum(1 for _, _, future in self._waiters if not future.done()),
+        }
+
+    # Slots
+
+    def _try_acquire(self) -> bool:
+        if self._in_flight < self.limit and not any(not future.done() for _, _, future in self._waiters):
+            self._in_flight += 1
+            return True
+        return False
+
+    async def _acquire(self, priority: int):
+        if self._try_acquire():
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted just as we were cancelled: hand the slot on
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        self._in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._in_flight < self.limit:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._in_flight += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None):
+        """Hold one slot for the duration of the block."""
+        await self._acquire(llm_priority.get() if priority is None else priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    # AIMD
+
+    def _increase(self):
+        self._limit = min(self.maximum, self._limit + 1 / self._limit)
+        LLM_CONCURRENCY_LIMIT.set(self._limit)
+        self._wake()
+
+    def decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < _DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self._limit = max(self.minimum, self._limit / 2)
+        LLM_CONCURRENCY_LIMIT.set(self._limit)
+
+    def _percentile(self, kind: str, fraction: float) -> Optional[float]:
+        samples = self._latencies[kind]
+        if len(samples) < _MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def _observe(self, kind: str, seconds: float):
+        median = self._percentile(kind, 0.5)
+        self._latencies[kind].append(seconds)
+        if median is not None and seconds > LLM_LATENCY_FACTOR * median:
+            self.decrease()
+        else:
+            self._increase()
+
+    # Calls
+
+    async def _hedged(self, call: Callable[[], Awaitable[Any]], kind: str, delay: float) -> Any:
+        primary = asyncio.ensure_future(call())
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        # Hedges only use spare capacity, never a queued caller's slot
+        if done or not self._try_acquire():
+            return await primary
+
+        hedge = asyncio.ensure_future(call())
+        try:
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        LLM_HEDGES.labels(kind=kind, winner="hedge" if task is hedge else "primary").inc()
+                        return task.result()
+            return await primary
+        finally:
+            for task in (primary, hedge):
+                if not task.done():
+                    task.cancel()
+            self._release()
+
+    async def _attempt(self, call: Callable[[], Awaitable[Any]], kind: str, priority: int) -> Any:
+        async with self.slot(priority):
+            started = time.monotonic()
+            try:
+                delay = self._percentile(kind, 0.95) if self.hedging else None
+                result = await (self._hedged(call, kind, delay) if delay else call())
+            except Exception as e:
+                if retry_reason(e) == "rate_limited":
+                    self.decrease()
+                raise
+            self._observe(kind, time.monotonic() - started)
+            return result
+
+    async def run(self, call: Callable[[], Awaitable[Any]], kind: str = "other") -> Any:
+        """Run `call` (a coroutine factory) under the limit, retrying transient failures."""
+        priority = llm_priority.get()
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._attempt(call, kind, priority)
+            except Exception as e:
+                reason = retry_reason(e)
+                if reason is None or attempt == self.max_retries:
+                    raise
+                LLM_RETRIES.labels(kind=kind, reason=reason).inc()
+                # Full jitter spreads out callers that failed together
+                await asyncio.sleep(random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt)))
+
+
+llm_scheduler = LLMScheduler()
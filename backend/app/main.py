@@ -5,18 +5,23 @@ from dotenv import load_dotenv
 env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
+# Set IMPORT_PROFILE to print how long each module takes to import
+import import_profile
+if os.getenv("IMPORT_PROFILE"):
+    import_profile.install()
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from db import init
+from fastapi.responses import FileResponse, JSONResponse, Response
 from api import router
-import vertexai
+from job_queue import investigation_queue
+from warmup import warmup
+import metrics
 
-# Initialize Vertex AI with project and location
-project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
-location = os.getenv('VERTEXAI_LOCATION', 'us-central1')
-vertexai.init(project=project_id, location=location)
+# Vertex AI, Gemini, Firestore and GPT Researcher are initialized on first
+# use, or in the background by the warm-up hook
+import_profile.report()
 
 app = FastAPI(
     title="Verfi AI API",
@@ -35,12 +40,20 @@ app = FastAPI(
     },
 )
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Ready once the background warm-up has initialized every client (always, when warm-up is off)"""
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -50,8 +63,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Firestore database
-init()
+@app.on_event("startup")
+async def start_investigation_workers():
+    await investigation_queue.start()
+
+@app.on_event("startup")
+async def start_warmup():
+    warmup.start()
+
+@app.on_event("shutdown")
+async def stop_investigation_workers():
+    await investigation_queue.stop()
 
 # Include the router with version prefix
 app.include_router(
@@ -0,0 +1,98 @@
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from typing import Any, Iterable
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Buckets span fast lookups through multi-minute research runs
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "verifix_pipeline_stage_seconds", "Time spent in each investigation pipeline stage",
+    ["stage", "outcome"], buckets=_BUCKETS,
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "verifix_llm_request_seconds", "Gemini request latency by prompt kind",
+    ["kind", "outcome"], buckets=_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "verifix_llm_tokens_total", "Gemini tokens from response usage metadata, by prompt kind",
+    ["kind", "type"],
+)
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "verifix_llm_concurrency_limit", "Current adaptive limit on concurrent Gemini calls",
+)
+LLM_RETRIES = Counter(
+    "verifix_llm_retries_total", "Gemini calls retried after a transient failure", ["kind", "reason"],
+)
+LLM_HEDGES = Counter(
+    "verifix_llm_hedges_total", "Hedged Gemini calls, by which request answered first", ["kind", "winner"],
+)
+STORAGE_SECONDS = Histogram(
+    "verifix_storage_seconds", "Storage backend call latency",
+    ["store", "operation", "outcome"], buckets=_BUCKETS,
+)
+EMBEDDING_SECONDS = Histogram(
+    "verifix_embedding_request_seconds", "Embedding model request latency", ["outcome"], buckets=_BUCKETS,
+)
+EMBEDDING_TEXTS = Counter(
+    "verifix_embedding_texts_total", "Texts embedded, by whether the embedding cache had them", ["source"],
+)
+
+# usage_metadata attribute -> token type label
+_USAGE_FIELDS = {
+    "prompt_token_count": "prompt",
+    "candidates_token_count": "output",
+    "cached_content_token_count": "cached",
+    "thoughts_token_count": "thoughts",
+}
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """Observe the duration of a block, labelled with outcome=ok or outcome=error."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        histogram.labels(**labels, outcome=outcome).observe(time.perf_counter() - started)
+
+
+def record_usage(kind: str, usage_metadata: Any):
+    """Add the token counts from a Gemini response's usage metadata."""
+    if usage_metadata is None:
+        return
+    for field, token_type in _USAGE_FIELDS.items():
+        count = getattr(usage_metadata, field, None)
+        if count:
+            LLM_TOKENS.labels(kind=kind, type=token_type).inc(count)
+
+
+def _timed_iterator(iterator, store: str, operation: str):
+    with timed(STORAGE_SECONDS, store=store, operation=operation):
+        yield from iterator
+
+
+def timed_storage_call(function, store: str, operation: str):
+    """Wrap a storage function so every call is observed; iterators are timed until exhausted."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if inspect.isgeneratorfunction(function):
+            return _timed_iterator(function(*args, **kwargs), store, operation)
+        with timed(STORAGE_SECONDS, store=store, operation=operation):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def instrument_store(store: Any, name: str, operations: Iterable[str]):
+    """Time the given methods of a store instance."""
+    for operation in operations:
+        setattr(store, operation, timed_storage_call(getattr(store, operation), name, operation))
+
+
+def render():
+    """Current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,19 @@
+"""Rewrite stored question embeddings in the compact blob format.
+
+Usage: python migrate_embeddings.py [float16|int8]
+
+Documents already in blob form are left alone, so the migration can be
+re-run safely. Without an argument EMBEDDING_STORAGE_FORMAT is used.
+"""
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
+
+from db import init, questions
+
+if __name__ == "__main__":
+    storage_format = sys.argv[1] if len(sys.argv) > 1 else None
+    init()
+    print(questions.migrate_embeddings(storage_format))
@@ -27,7 +27,7 @@ class SolutionModel(BaseModel):
     title: Optional[str] = Field("", description="Title of the solution")
     description: Optional[str] = Field("", description="Description of the solution")
     solution_steps: Optional[List[str]] = Field(default_factory=list, description="List of solution steps")
-    status: Optional[str] = Field("", description="Current status of the investigation: analyzing, processing, identifying, validating, storing, complete, or error")
+    status: Optional[str] = Field("", description="Current status of the investigation: queued, analyzing, processing, identifying, validating, storing, complete, or error")
     verified: bool = Field(False, description="Whether the solution has been verified")
     error_code: Optional[str] = Field("", description="Machine/system error code")
     machine_name: Optional[str] = Field("", description="Name/tag of machine")
@@ -40,6 +40,7 @@ class SolutionModel(BaseModel):
     tags: Optional[List[str]] = Field(default_factory=list, description="Tags for filtering")
     links: Optional[List[LinkModel]] = Field(default_factory=list, description="Links to related documentation and resources")
     inventory_id: Optional[str] = Field(None, description="ID of the associated inventory item")
+    inventory: Optional[dict] = Field(None, description="The associated inventory item, when requested with include_inventory")
     created_at: Optional[datetime] = Field(None, description="Creation date of the solution")
     updated_at: Optional[datetime] = Field(None, description="Last update date of the solution")
 
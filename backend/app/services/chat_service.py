@@ -0,0 +1,93 @@
+from typing import Any, AsyncIterator, Dict, List
+import asyncio
+import os
+from llm_model import generate_response, stream_response
+from embedding_service import embed_text_async
+from utils import estimate_tokens
+from db import solutions, questions
+
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", "8"))
+CHAT_MIN_SCORE = float(os.getenv("CHAT_MIN_SCORE", "0.5"))
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "8000"))
+
+# Added to a solution's context block only if budget remains after every compact block
+DETAIL_FIELDS = ['manufacturer', 'machine_name', 'model_number', 'error_code', 'component', 'resolution_type']
+
+
+def _compact_block(solution: Dict[str, Any]) -> str:
+    steps = "\n".join(f"  {step}" for step in solution.get('solution_steps') or [])
+    return (f"Solution {solution['id']}\n"
+            f"Title: {solution.get('title', '')}\n"
+            f"Description: {solution.get('description', '')}\n"
+            f"Steps:\n{steps}")
+
+
+def _detail_block(solution: Dict[str, Any]) -> str:
+    return "\n".join(f"{field.replace('_', ' ').capitalize()}: {solution[field]}"
+                     for field in DETAIL_FIELDS if solution.get(field) and solution[field] != "N/A")
+
+
+def pack_context(ranked_solutions: List[Dict[str, Any]], budget: int = CHAT_CONTEXT_TOKENS) -> str:
+    """Pack solutions, most relevant first, into a token budget.
+
+    Compact fields (title, description, steps) are packed first for every
+    solution; remaining budget is then spent on detail fields in rank order.
+    """
+    blocks = []
+    remaining = budget
+    for solution in ranked_solutions:
+        block = _compact_block(solution)
+        cost = estimate_tokens(block)
+        if cost > remaining:
+            break
+        blocks.append(block)
+        remaining -= cost
+
+    for i, solution in enumerate(ranked_solutions[:len(blocks)]):
+        detail = _detail_block(solution)
+        cost = estimate_tokens(detail)
+        if detail and cost <= remaining:
+            blocks[i] = f"{blocks[i]}\n{detail}"
+            remaining -= cost
+
+    return "\n\n".join(blocks)
+
+
+async def retrieve_solutions(question: str, limit: int = CHAT_TOP_K) -> List[Dict[str, Any]]:
+    """Return the solutions most relevant to the question, best match first."""
+    embedding = await embed_text_async(question)
+    # Over-fetch since several questions can point to the same solution
+    matches = await asyncio.to_thread(questions.find_similar, embedding, limit * 2, CHAT_MIN_SCORE, question)
+
+    solution_ids = []
+    for match in matches:
+        solution_id = match.get('solution_id')
+        if solution_id and solution_id not in solution_ids:
+            solution_ids.append(solution_id)
+
+    return await asyncio.to_thread(solutions.get_many, solution_ids[:limit])
+
+
+async def build_chat_prompt(question: str) -> str:
+    context = pack_context(await retrieve_solutions(question))
+    return f"""
+    You are a helpful assistant that can answer questions about the solutions in the database.
+    The solutions below were retrieved by vector and keyword similarity as the most relevant to the question.
+    If they do not contain the answer, say so rather than guessing.
+    The solutions are:
+{context or "No relevant solutions were found."}
+    The question is: {question}
+    The response should be in the same language as the question.
+    The response should be helpful and informative.
+    """
+
+
+async def answer_question(question: str) -> str:
+    """Answer a question using the most relevant stored solutions as context."""
+    return await generate_response(await build_chat_prompt(question), kind="chat")
+
+
+async def stream_answer(question: str) -> AsyncIterator[str]:
+    """Like answer_question, but yields the answer in chunks as it is generated."""
+    async for chunk in stream_response(await build_chat_prompt(question), kind="chat"):
+        yield chunk
@@ -0,0 +1,99 @@
+from typing import Tuple
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import os
+from PIL import Image, ImageOps, UnidentifiedImageError
+from llm_model import generate_response
+from ttl_cache import TTLCache
+
+# Longest side, in pixels, of images sent to the model
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1568"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+
+IMAGE_ANALYSIS_PROMPT = "Analyze this image and describe what you see, focusing on any visible technical issues, machine parts, or error displays."
+
+image_analysis_cache = TTLCache(
+    max_entries=int(os.getenv("IMAGE_ANALYSIS_CACHE_SIZE", "500")),
+    ttl=float(os.getenv("IMAGE_ANALYSIS_CACHE_TTL_SECONDS", "3600")),
+)
+
+# Sent as-is when Pillow cannot decode them
+PASSTHROUGH_MIME_TYPES = {"image/heic"}
+
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+
+
+def sniff_mime_type(data: bytes) -> str:
+    """Detect an image's real format from its magic bytes."""
+    for signature, mime_type in _SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:8] == b"ftyp" and data[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    return "application/octet-stream"
+
+
+def preprocess_image(data: bytes) -> Tuple[bytes, str]:
+    """Downsize and recompress an image for upload.
+
+    Returns the bytes to send and their MIME type. Formats Pillow cannot
+    decode but the model accepts are passed through unchanged; anything else,
+    including decompression bombs, raises ValueError.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image)
+    except Image.DecompressionBombError:
+        raise ValueError("image_data is too large to process")
+    except (UnidentifiedImageError, OSError):
+        mime_type = sniff_mime_type(data)
+        # The model reads HEIC photos (iPhone default) that Pillow needs a plugin for
+        if mime_type in PASSTHROUGH_MIME_TYPES:
+            return data, mime_type
+        raise ValueError(f"image_data is not a supported image (detected {mime_type})")
+
+    image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        # JPEG has no alpha; flatten transparent areas onto white rather than black
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    output = io.BytesIO()
+    image.convert("RGB").save(output, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    # Keep the original if recompressing did not make it smaller
+    if len(output.getvalue()) >= len(data) and sniff_mime_type(data) == "image/jpeg":
+        return data, "image/jpeg"
+    return output.getvalue(), "image/jpeg"
+
+
+async def analyze_image(image_data: str) -> str:
+    """Describe a base64 encoded image, reusing the earlier analysis of an identical upload."""
+    try:
+        raw = base64.b64decode(image_data)
+    except (binascii.Error, ValueError):
+        raise ValueError("image_data is not valid base64")
+
+    content_key = f"sha256:{hashlib.sha256(raw).hexdigest()}"
+    cached = image_analysis_cache.get(content_key)
+    if cached is not None:
+        return cached
+
+    processed, mime_type = await asyncio.to_thread(preprocess_image, raw)
+    analysis = await generate_response(IMAGE_ANALYSIS_PROMPT, image_data=processed, image_mime_type=mime_type,
+                                      kind="image_analysis")
+    # An empty analysis (blocked or truncated response) is not cached, so a retry can succeed
+    if analysis:
+        image_analysis_cache.set(content_key, analysis)
+    return analysis
@@ -1,9 +1,11 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import json
-from llm_model import generate_response
+from llm_model import CACHED_CONTEXT_PLACEHOLDER, generate_response
 from db import inventory
 
-async def extract_component_info(text: str) -> Dict[str, Any]:
+async def extract_component_info(text: str, cached_content: Optional[str] = None) -> Dict[str, Any]:
+    if cached_content:
+        text = CACHED_CONTEXT_PLACEHOLDER
     prompt = f"""You are an expert data extraction AI. Your task is to extract detailed component or machine information from the provided text and structure it as a valid JSON object.
 
 Follow these instructions carefully:
@@ -34,16 +36,18 @@ Provided text:
 {text}"""
 
     try:
-        response = await generate_response(prompt)
+        response = await generate_response(prompt, kind="inventory", cached_content=cached_content)
         return json.loads(response)
     except (json.JSONDecodeError, Exception) as e:
         print(f"Error extracting component info: {e}")
         return {}
 
-async def store_model_info(report: str, solution_data: Dict[str, Any]) -> str:
-    component_info = await extract_component_info(report)
+async def build_model_info(report: str, solution_data: Dict[str, Any],
+                           report_cache: Optional[str] = None) -> Dict[str, Any]:
+    """Extract the inventory document for a report without storing it."""
+    component_info = await extract_component_info(report, report_cache)
 
-    inventory_data = {
+    return {
         'manufacturer': solution_data.get('manufacturer', component_info.get('manufacturer', 'Unknown')),
         'model_name': component_info.get('model_name', 'Unknown'),
         'component_type': solution_data.get('component', component_info.get('component_type', 'Unknown')),
@@ -56,4 +60,6 @@ async def store_model_info(report: str, solution_data: Dict[str, Any]) -> str:
             'last_service': component_info.get('last_service')
         }
     }
-    return inventory.create(inventory_data)
+
+async def store_model_info(report: str, solution_data: Dict[str, Any]) -> str:
+    return inventory.create(await build_model_info(report, solution_data))
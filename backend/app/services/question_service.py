@@ -1,7 +1,10 @@
-from typing import Dict, Optional
+from typing import Dict, List
+import asyncio
+import re
+import unicodedata
 from llm_model import generate_response
-from utils import embed_text
-from db import questions
+from embedding_service import embed_text_async
+from db import questions, solutions
 
 async def prepare_question(question: str) -> str:
     """Clean and prepare the question using LLM."""
@@ -20,9 +23,25 @@ Input:
 {question}
 
 Output:
-""")
+""", kind="prepare_question")
 
-def find_existing_solution(question: str) -> Optional[Dict]:
-    """Search for an existing solution using vector similarity."""
-    embedding = embed_text(question)
-    return questions.find_similar(embedding)
+def normalize_question(question: str) -> str:
+    """Canonical form of a cleaned question, used to detect duplicate investigations."""
+    text = unicodedata.normalize("NFKC", question).lower()
+    # Keep hyphens, they are part of model numbers such as S7-1500
+    text = re.sub(r"[^\w\s-]", " ", text)
+    return " ".join(text.split())
+
+async def find_existing_solution(question: str) -> List[Dict]:
+    """Search for existing solutions using vector similarity, best match first, with scores.
+
+    The similarity index can still hold questions whose solution was deleted
+    by another instance, so matches are checked against the stored solutions.
+    """
+    embedding = await embed_text_async(question)
+    matches = await asyncio.to_thread(questions.find_similar, embedding, query_text=question)
+    solution_ids = list({match['solution_id'] for match in matches if match.get('solution_id')})
+    if not solution_ids:
+        return matches
+    existing = {solution['id'] for solution in await asyncio.to_thread(solutions.get_many, solution_ids)}
+    return [match for match in matches if not match.get('solution_id') or match['solution_id'] in existing]
@@ -1,52 +1,71 @@
-from gpt_researcher import GPTResearcher
-from utils import embed_text
-from db import solutions
+from typing import TYPE_CHECKING
+import asyncio
+from embedding_service import embed_text_async
 from services.solution_service import generate_confidence_score, process_solution_report
-from services.inventory_service import store_model_info
-from db import solutions, questions
+from services.inventory_service import build_model_info
+from db import solutions, commit_investigation
+from status_broker import status_broker
+from metrics import PIPELINE_STAGE_SECONDS, timed
+from llm_model import cached_context
 
-async def process_research_report(question: str, researcher: GPTResearcher, solution_id: str):
-    """Process and save a research report."""
+if TYPE_CHECKING:
+    from gpt_researcher import GPTResearcher
+
+def update_status(solution_id: str, status: str, data: dict = None):
+    """Persist a status change and push it to in-process subscribers."""
+    solutions.update(solution_id, {**(data or {}), 'status': status})
+    status_broker.publish(solution_id, status)
+
+async def process_research_report(question: str, researcher: "GPTResearcher", solution_id: str):
+    """Process and save a research report.
+
+    Storage writes run in worker threads so they do not block the event loop
+    that also serves web requests.
+    """
     try:
         # Update status to analyzing
-        solutions.update(solution_id, {'status': 'analyzing'})
-        await researcher.conduct_research()
+        await asyncio.to_thread(update_status, solution_id, 'analyzing')
+        with timed(PIPELINE_STAGE_SECONDS, stage='conduct_research'):
+            await researcher.conduct_research()
 
         # Update status to processing
-        solutions.update(solution_id, {'status': 'processing'})
-        report = await researcher.write_report()
-
-        # Update status to identifying
-        solutions.update(solution_id, {'status': 'identifying'})
-        solution_data = await process_solution_report(question, report)
-        solution_data['text'] = report
-        solution_data['verified'] = False
-
-        # Update status to validating
-        solutions.update(solution_id, {'status': 'validating'})
-        solution_data['confidence'] = await generate_confidence_score(solution_data)
-
-        # Store model info and create embeddings
-        solutions.update(solution_id, {'status': 'storing'})
-        inventory_id = await store_model_info(report, solution_data)
-        solution_data['inventory_id'] = inventory_id
-
-        embedding = embed_text(question)
-        questions.create({
-            'text': question,
-            'solution_id': solution_id,
-            'inventory_id': inventory_id,
-            'embedding': embedding
-        })
+        await asyncio.to_thread(update_status, solution_id, 'processing')
+        with timed(PIPELINE_STAGE_SECONDS, stage='write_report'):
+            report = await researcher.write_report()
+
+        # The extraction and inventory prompts share one cached copy of the report
+        async with cached_context(report, kind="report") as report_cache:
+            # Update status to identifying
+            await asyncio.to_thread(update_status, solution_id, 'identifying')
+            with timed(PIPELINE_STAGE_SECONDS, stage='extraction'):
+                solution_data = await process_solution_report(question, report, report_cache)
+            solution_data['text'] = report
+            solution_data['verified'] = False
+
+            # Update status to validating
+            await asyncio.to_thread(update_status, solution_id, 'validating')
+            with timed(PIPELINE_STAGE_SECONDS, stage='confidence'):
+                solution_data['confidence'] = await generate_confidence_score(solution_data)
+
+            # Extract model info and create embeddings
+            await asyncio.to_thread(update_status, solution_id, 'storing')
+            with timed(PIPELINE_STAGE_SECONDS, stage='inventory'):
+                inventory_data = await build_model_info(report, solution_data, report_cache)
+        with timed(PIPELINE_STAGE_SECONDS, stage='embedding'):
+            embedding = await embed_text_async(question)
 
-        # Update final status
+        # Store the final solution, inventory and question in one batched write
         solution_data['status'] = 'complete'
-        solutions.update(solution_id, solution_data)
+        with timed(PIPELINE_STAGE_SECONDS, stage='store'):
+            await asyncio.to_thread(commit_investigation, solution_id, solution_data, inventory_data, {
+                'text': question,
+                'embedding': embedding
+            })
+        status_broker.publish(solution_id, 'complete')
 
     except Exception as e:
         print(f"Error in process_research_report: {str(e)}")
-        solutions.update(solution_id, {
+        await asyncio.to_thread(update_status, solution_id, 'error', {
             'text': f"Error generating report: {str(e)}",
-            'status': 'error',
             'error': True
         })
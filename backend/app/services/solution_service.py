@@ -1,7 +1,32 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple, Union, get_args, get_origin
 import asyncio
 import json
-from llm_model import generate_response
+import os
+from pydantic import BaseModel
+from llm_model import CACHED_CONTEXT_PLACEHOLDER, generate_response
+from models import SolutionModel
+
+# "structured" asks for every field in one JSON-schema call; "fanout" sends one prompt per field
+SOLUTION_EXTRACTION_MODE = os.getenv("SOLUTION_EXTRACTION_MODE", "structured")
+STRUCTURED_EXTRACTION_RETRIES = int(os.getenv("STRUCTURED_EXTRACTION_RETRIES", "1"))
+
+EXTRACTION_FIELDS = [
+    'description', 'solution_steps', 'manufacturer', 'machine_name', 'model_number',
+    'error_code', 'component', 'resolution_type', 'downtime_impact', 'links',
+]
+
+STRUCTURED_FIELD_INSTRUCTIONS = {
+    'description': "A concise, self-contained description that directly addresses the question and summarizes the solution in the report.",
+    'solution_steps': "The distinct solution steps for the issue, each a complete sentence prefixed with its number (e.g. \"1. Power down the system\").",
+    'manufacturer': "The manufacturer of the primary equipment/system, or \"N/A\".",
+    'machine_name': "The name of the machine/equipment discussed, or \"N/A\".",
+    'model_number': "The model number of the equipment/system, or \"N/A\".",
+    'error_code': "The error code(s) related to the issue, separated by a comma and a space (e.g. \"E101, E102\"), or \"N/A\".",
+    'component': "The primary affected component, or \"N/A\".",
+    'resolution_type': "The type of resolution, e.g. \"Hardware Fix\", \"Software Update\", \"Configuration Change\", \"Replacement\", \"Adjustment\", \"Maintenance\", \"Consultation\", \"No Action Required\", or \"N/A\".",
+    'downtime_impact': "Exactly one of: High, Medium, Low, N/A.",
+    'links': "Documentation links (manuals, knowledge base articles, support pages, troubleshooting guides) relevant to the question, each with a title and url.",
+}
 
 async def generate_confidence_score(solution_dict: Dict[str, Any]) -> str:
     """Generate a confidence score for a solution using LLM."""
@@ -29,7 +54,7 @@ async def generate_confidence_score(solution_dict: Dict[str, Any]) -> str:
     Verified: {solution_dict.get('verified', False)}
     """
 
-    confidence_score = await generate_response(confidence_prompt)
+    confidence_score = await generate_response(confidence_prompt, kind="confidence")
     confidence_score = confidence_score.strip()
     try:
         confidence_score = int(confidence_score)
@@ -39,9 +64,13 @@ async def generate_confidence_score(solution_dict: Dict[str, Any]) -> str:
     except ValueError:
         return "0"  # Default if LLM doesn't return a valid number
 
-async def process_solution_report(question: str, report: str) -> Dict[str, Any]:
-    """Process a solution report and extract relevant data."""
-    prompts_list = [
+def _report_in_prompt(report: str, report_cache: Optional[str]) -> str:
+    """The report text to embed in a prompt, or a reference to it when it is cached."""
+    return CACHED_CONTEXT_PLACEHOLDER if report_cache else report
+
+def _fanout_prompts(question: str, report: str) -> List[Tuple[str, str]]:
+    """One extraction prompt per solution field, each carrying the full report (or its placeholder)."""
+    return [
         ("description",
      f"""You are an expert technical writer.
 Based on the provided report and the specific question asked, generate a concise and informative description.
@@ -203,8 +232,15 @@ Report:
 {report}""")
     ]
 
+async def _extract_fanout(question: str, report: str, fields: Optional[List[str]] = None,
+                          report_cache: Optional[str] = None) -> Dict[str, Any]:
+    """Extract fields with one prompt per field, run in parallel."""
+    prompts_list = [(key, prompt) for key, prompt in _fanout_prompts(question, _report_in_prompt(report, report_cache))
+                    if fields is None or key in fields]
+
     # Create list of coroutines for parallel execution
-    coroutines = [generate_response(prompt) for _, prompt in prompts_list]
+    coroutines = [generate_response(prompt, kind=f"extract_{key}", cached_content=report_cache)
+                  for key, prompt in prompts_list]
 
     # Run all extractive queries in parallel
     results = await asyncio.gather(*coroutines)
@@ -213,26 +249,129 @@ Report:
     extracted_data = {key: result for (key, _), result in zip(prompts_list, results)}
 
     # Handle solution steps parsing with fallback
-    try:
-        solution_steps = json.loads(extracted_data['solution_steps'])
-        if not isinstance(solution_steps, list):
-            solution_steps = ["Could not parse solution steps - invalid format"]
-    except json.JSONDecodeError:
-        print("Error parsing solution steps:", extracted_data['solution_steps'])
-        solution_steps = ["Could not parse solution steps"]
+    if 'solution_steps' in extracted_data:
+        try:
+            solution_steps = json.loads(extracted_data['solution_steps'])
+            if not isinstance(solution_steps, list):
+                solution_steps = ["Could not parse solution steps - invalid format"]
+        except json.JSONDecodeError:
+            print("Error parsing solution steps:", extracted_data['solution_steps'])
+            solution_steps = ["Could not parse solution steps"]
+        extracted_data['solution_steps'] = solution_steps
 
     # Handle links parsing with fallback
-    try:
-        links = json.loads(extracted_data['links']) if extracted_data['links'].strip() else []
-        if not isinstance(links, list):
+    if 'links' in extracted_data:
+        try:
+            links = json.loads(extracted_data['links']) if extracted_data['links'].strip() else []
+            if not isinstance(links, list):
+                links = []
+        except json.JSONDecodeError:
+            print("Error parsing links:", extracted_data['links'])
             links = []
-    except json.JSONDecodeError:
-        print("Error parsing links:", extracted_data['links'])
-        links = []
+        extracted_data['links'] = links
+
+    return extracted_data
+
+def _schema_for(annotation) -> Dict[str, Any]:
+    """Translate a pydantic field annotation into a Gemini response schema."""
+    if get_origin(annotation) is Union:
+        annotation = next(arg for arg in get_args(annotation) if arg is not type(None))
+    if get_origin(annotation) in (list, List):
+        return {"type": "ARRAY", "items": _schema_for(get_args(annotation)[0])}
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return {
+            "type": "OBJECT",
+            "properties": {name: {**_schema_for(field.annotation), "description": field.description or ""}
+                           for name, field in annotation.model_fields.items()},
+            "required": [name for name, field in annotation.model_fields.items() if field.is_required()],
+        }
+    if annotation is bool:
+        return {"type": "BOOLEAN"}
+    return {"type": "STRING"}
+
+def build_extraction_schema(fields: List[str]) -> Dict[str, Any]:
+    """Response schema for the given SolutionModel fields."""
+    properties = {}
+    for name in fields:
+        field = SolutionModel.model_fields[name]
+        properties[name] = {**_schema_for(field.annotation), "description": field.description or ""}
+    return {"type": "OBJECT", "properties": properties, "required": list(fields)}
+
+def _validate_field(name: str, value: Any) -> bool:
+    if name == 'solution_steps':
+        return isinstance(value, list) and all(isinstance(step, str) for step in value)
+    if name == 'links':
+        return isinstance(value, list) and all(
+            isinstance(link, dict) and isinstance(link.get('title'), str) and isinstance(link.get('url'), str)
+            for link in value
+        )
+    return isinstance(value, str) and value.strip() != ""
+
+def _structured_prompt(question: str, report: str, fields: List[str]) -> str:
+    instructions = "\n".join(f"- {name}: {STRUCTURED_FIELD_INSTRUCTIONS[name]}" for name in fields)
+    return f"""You are an expert technical data extraction AI.
+From the report below, extract the following fields about the issue raised in the question: '{question}'.
+
+Fields:
+{instructions}
+
+Return a single JSON object containing exactly these fields.
+For text fields that cannot be determined from the report, use the string "N/A".
+For list fields with nothing relevant in the report, use an empty array.
+
+Report:
+{report}"""
+
+async def _extract_structured(question: str, report: str, report_cache: Optional[str] = None) -> Dict[str, Any]:
+    """Extract all fields in one structured-output call, re-asking only for invalid fields."""
+    extracted_data: Dict[str, Any] = {}
+    missing = list(EXTRACTION_FIELDS)
+
+    for attempt in range(1 + STRUCTURED_EXTRACTION_RETRIES):
+        try:
+            response = await generate_response(
+                _structured_prompt(question, _report_in_prompt(report, report_cache), missing),
+                response_schema=build_extraction_schema(missing),
+                kind="extract_structured",
+                cached_content=report_cache,
+            )
+            # No text (MAX_TOKENS, a safety block) is handled like unparseable output
+            result = json.loads(response or "{}")
+            if not isinstance(result, dict):
+                result = {}
+        except (json.JSONDecodeError, TypeError):
+            print("Error parsing structured extraction:", response)
+            result = {}
+
+        for name in missing:
+            if name in result and _validate_field(name, result[name]):
+                extracted_data[name] = result[name]
+        missing = [name for name in EXTRACTION_FIELDS if name not in extracted_data]
+        if not missing:
+            break
+        print(f"Structured extraction attempt {attempt + 1} missing fields: {missing}")
+
+    if missing:
+        # Last resort: the per-field prompts for whatever is still missing
+        extracted_data.update(await _extract_fanout(question, report, missing, report_cache))
+
+    return extracted_data
+
+async def process_solution_report(question: str, report: str, report_cache: Optional[str] = None) -> Dict[str, Any]:
+    """Process a solution report and extract relevant data.
+
+    `report_cache` names a context cache holding the report (see
+    `llm_model.cached_context`); the prompts then refer to it instead of
+    repeating the report.
+    """
+    if SOLUTION_EXTRACTION_MODE == "fanout":
+        extracted_data = await _extract_fanout(question, report, report_cache=report_cache)
+    else:
+        extracted_data = await _extract_structured(question, report, report_cache)
 
     return {
         'description': extracted_data['description'],
-        'solution_steps': solution_steps,
+        'solution_steps': extracted_data['solution_steps'],
         'manufacturer': extracted_data['manufacturer'],
         'machine_name': extracted_data['machine_name'],
         'model_number': extracted_data['model_number'],
@@ -240,5 +379,5 @@ Report:
         'component': extracted_data['component'],
         'resolution_type': extracted_data['resolution_type'],
         'downtime_impact': extracted_data['downtime_impact'],
-        'links': links
+        'links': extracted_data['links']
     }
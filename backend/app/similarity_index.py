@@ -0,0 +1,132 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+class SimilarityIndex:
+    """Process-local cosine similarity index over question embeddings.
+
+    Embeddings are L2-normalized once on insert and kept in a contiguous
+    float32 matrix, so a query is a single matrix-vector product followed by
+    an argpartition top-k instead of a per-document Python loop.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._payloads: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if vector.size == 0 or norm == 0:
+            return None
+        return vector / norm
+
+    def _ensure_capacity(self, dimension: int, required: int):
+        if self._matrix is None:
+            capacity = max(self._initial_capacity, required)
+            self._matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        elif self._matrix.shape[0] < required:
+            capacity = max(self._matrix.shape[0] * 2, required)
+            grown = np.zeros((capacity, dimension), dtype=np.float32)
+            grown[:len(self._ids)] = self._matrix[:len(self._ids)]
+            self._matrix = grown
+
+    def add(self, item_id: str, embedding, payload: Optional[Dict[str, Any]] = None) -> bool:
+        """Add or replace a single embedding. Returns False if it was skipped."""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return False
+
+        with self._lock:
+            if self.dimension is not None and vector.shape[0] != self.dimension:
+                print(f"Skipping embedding {item_id}: dimension {vector.shape[0]} != {self.dimension}")
+                return False
+
+            position = self._positions.get(item_id)
+            if position is None:
+                position = len(self._ids)
+                self._ensure_capacity(vector.shape[0], position + 1)
+                self._ids.append(item_id)
+                self._payloads.append(payload or {})
+                self._positions[item_id] = position
+            else:
+                self._payloads[position] = payload or {}
+
+            self._matrix[position] = vector
+            return True
+
+    def remove(self, item_id: str) -> bool:
+        """Remove an embedding by moving the last row into its slot."""
+        with self._lock:
+            position = self._positions.pop(item_id, None)
+            if position is None:
+                return False
+
+            last = len(self._ids) - 1
+            if position != last:
+                self._matrix[position] = self._matrix[last]
+                self._ids[position] = self._ids[last]
+                self._payloads[position] = self._payloads[last]
+                self._positions[self._ids[position]] = position
+
+            self._ids.pop()
+            self._payloads.pop()
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._matrix = None
+            self._ids = []
+            self._payloads = []
+            self._positions = {}
+
+    def search(self, embedding, limit: int = 5, min_score: float = 0.0) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """Return up to `limit` (id, score, payload) tuples, highest score first."""
+        query = self._normalize(embedding)
+        if query is None or limit <= 0:
+            return []
+
+        with self._lock:
+            count = len(self._ids)
+            if count == 0 or query.shape[0] != self.dimension:
+                return []
+
+            scores = self._matrix[:count] @ query
+            candidates = np.flatnonzero(scores >= min_score)
+            if candidates.size == 0:
+                return []
+
+            if candidates.size > limit:
+                top = np.argpartition(scores[candidates], -limit)[-limit:]
+                candidates = candidates[top]
+            candidates = candidates[np.argsort(scores[candidates])[::-1]]
+
+            return [(self._ids[i], float(scores[i]), self._payloads[i]) for i in candidates]
+
+    def score_ids(self, embedding, item_ids: List[str]) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """Return (id, score, payload) for the given IDs that are in the index."""
+        query = self._normalize(embedding)
+        if query is None:
+            return []
+
+        with self._lock:
+            if query.shape[0] != self.dimension:
+                return []
+            positions = [self._positions[item_id] for item_id in item_ids if item_id in self._positions]
+            if not positions:
+                return []
+            scores = self._matrix[positions] @ query
+            return [(self._ids[p], float(score), self._payloads[p]) for p, score in zip(positions, scores)]
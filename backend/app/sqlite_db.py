@@ -0,0 +1,454 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Any, Iterator, Tuple
+from utils import parse_json_field
+from storage import SolutionStore, QuestionStore, InventoryStore
+from embedding_codec import encode, is_encoded, as_vector, to_list
+import os
+import json
+import sqlite3
+import threading
+import uuid
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "./verifix.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS solutions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    status TEXT,
+    question_key TEXT,
+    lease_owner TEXT,
+    lease_expires_at TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS solutions_created_at ON solutions (created_at, id);
+CREATE INDEX IF NOT EXISTS solutions_status ON solutions (status);
+CREATE INDEX IF NOT EXISTS solutions_question_key ON solutions (question_key, status);
+
+CREATE TABLE IF NOT EXISTS questions (
+    id TEXT PRIMARY KEY,
+    text TEXT,
+    solution_id TEXT,
+    inventory_id TEXT,
+    embedding BLOB,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS questions_solution_id ON questions (solution_id);
+CREATE INDEX IF NOT EXISTS questions_created_at ON questions (created_at, id);
+
+CREATE TABLE IF NOT EXISTS inventory (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS inventory_created_at ON inventory (created_at, id);
+"""
+
+# Rows fetched per query when streaming a table
+CHUNK_SIZE = 500
+
+db = None
+_lock = threading.RLock()
+
+def get_db() -> sqlite3.Connection:
+    global db
+    if db is None:
+        with _lock:
+            if db is None:
+                conn = sqlite3.connect(SQLITE_PATH, check_same_thread=False, isolation_level=None)
+                conn.row_factory = sqlite3.Row
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("PRAGMA busy_timeout=5000")
+                conn.executescript(SCHEMA)
+                db = conn
+    return db
+
+def init():
+    """Open the SQLite database and create the schema"""
+    get_db()
+
+def query(sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+    with _lock:
+        return get_db().execute(sql, params).fetchall()
+
+@contextmanager
+def transaction():
+    """Run statements on the shared connection as one atomic write transaction"""
+    with _lock:
+        conn = get_db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=lambda value: value.isoformat() if hasattr(value, 'isoformat') else str(value))
+
+def _chunks(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _placeholders(values: List[Any]) -> str:
+    return ",".join("?" for _ in values)
+
+def iter_rows(table: str, columns: str, limit: Optional[int] = None, after: Optional[str] = None) -> Iterator[sqlite3.Row]:
+    """Stream rows newest first in chunks, starting after the row with ID `after`.
+
+    Raises ValueError if the cursor row does not exist.
+    """
+    position = None
+    if after:
+        rows = query(f"SELECT created_at, id FROM {table} WHERE id = ?", (after,))
+        if not rows:
+            raise ValueError(f"Invalid cursor: {after}")
+        position = (rows[0]['created_at'], rows[0]['id'])
+
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+        if position:
+            rows = query(f"SELECT {columns}, created_at, id FROM {table} WHERE (created_at, id) < (?, ?) "
+                         f"ORDER BY created_at DESC, id DESC LIMIT ?", (*position, size))
+        else:
+            rows = query(f"SELECT {columns}, created_at, id FROM {table} ORDER BY created_at DESC, id DESC LIMIT ?", (size,))
+        yield from rows
+        if len(rows) < size:
+            return
+        position = (rows[-1]['created_at'], rows[-1]['id'])
+        if remaining is not None:
+            remaining -= len(rows)
+
+def _encode_embedding(embedding) -> Optional[bytes]:
+    if embedding is None:
+        return None
+    return encode(embedding)
+
+class SQLiteSolution(SolutionStore):
+    def _from_row(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        data = json.loads(row['data'])
+        data['id'] = row['id']
+        data['created_at'] = row['created_at']
+        data['updated_at'] = row['updated_at']
+        data['solution_steps'] = parse_json_field(data, 'solution_steps')
+        data['tags'] = parse_json_field(data, 'tags')
+        return data
+
+    def _prepare_create(self, solution_data: Dict[str, Any]) -> Dict[str, Any]:
+        # Keep parity with the Firestore backend, which stores None as ""
+        return {key: ("" if value is None else value) for key, value in solution_data.items()
+                if key not in ('id', 'created_at', 'updated_at')}
+
+    def create(self, solution_data: Dict[str, Any]) -> str:
+        """Create a new solution"""
+        solution_id = uuid.uuid4().hex
+        data = self._prepare_create(solution_data)
+        now = _now()
+        with transaction() as conn:
+            conn.execute(
+                "INSERT INTO solutions (id, data, status, question_key, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (solution_id, _dumps(data), data.get('status'), data.get('question_key'), now, now)
+            )
+        return solution_id
+
+    def get(self, solution_id: str) -> Optional[Dict[str, Any]]:
+        """Get a solution by ID"""
+        rows = query("SELECT * FROM solutions WHERE id = ?", (solution_id,))
+        return self._from_row(rows[0] if rows else None)
+
+    def get_many(self, solution_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get multiple solutions in one query, in the order requested"""
+        if not solution_ids:
+            return []
+        rows = query(f"SELECT * FROM solutions WHERE id IN ({_placeholders(solution_ids)})", tuple(solution_ids))
+        found = {row['id']: self._from_row(row) for row in rows}
+        return [found[solution_id] for solution_id in solution_ids if solution_id in found]
+
+    def iter_page(self, limit: Optional[int] = None, after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stream solutions newest first, optionally starting after a cursor ID"""
+        for row in iter_rows('solutions', 'data, updated_at', limit, after):
+            yield self._from_row(row)
+
+    def list_recent(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get most recent solutions"""
+        return list(self.iter_page(limit))
+
+    def _update_in(self, conn: sqlite3.Connection, solution_id: str, solution_data: Dict[str, Any]) -> bool:
+        row = conn.execute("SELECT data FROM solutions WHERE id = ?", (solution_id,)).fetchone()
+        if row is None:
+            return False
+        data = {**json.loads(row['data']), **self._prepare_create(solution_data)}
+        conn.execute(
+            "UPDATE solutions SET data = ?, status = ?, question_key = ?, updated_at = ? WHERE id = ?",
+            (_dumps(data), data.get('status'), data.get('question_key'), _now(), solution_id)
+        )
+        return True
+
+    def update(self, solution_id: str, solution_data: Dict[str, Any]) -> bool:
+        """Update a solution"""
+        with transaction() as conn:
+            return self._update_in(conn, solution_id, solution_data)
+
+    def delete(self, solution_id: str) -> bool:
+        """Delete a solution by ID"""
+        try:
+            with transaction() as conn:
+                conn.execute("DELETE FROM solutions WHERE id = ?", (solution_id,))
+            return True
+        except sqlite3.Error as e:
+            print(f"Error deleting solution: {str(e)}")
+            return False
+
+    def list_by_status(self, statuses: List[str]) -> List[Dict[str, Any]]:
+        """Get all solutions whose status is one of the given values"""
+        rows = query(f"SELECT * FROM solutions WHERE status IN ({_placeholders(statuses)})", tuple(statuses))
+        return [self._from_row(row) for row in rows]
+
+    def find_active_by_key(self, question_key: str, statuses: List[str]) -> Optional[str]:
+        """Get the ID of a live solution for the same normalized question that is still in one of the given statuses"""
+        rows = query(
+            f"SELECT id, status, lease_expires_at FROM solutions WHERE question_key = ? AND status IN ({_placeholders(statuses)})",
+            (question_key, *statuses)
+        )
+        now = datetime.now(timezone.utc)
+        for row in rows:
+            # Past `queued` with an expired lease: its worker died
+            if row['status'] == 'queued' or (row['lease_expires_at']
+                                             and datetime.fromisoformat(row['lease_expires_at']) > now):
+                return row['id']
+        return None
+
+    def claim(self, solution_id: str, owner: str, lease_seconds: float, active_statuses: List[str]) -> bool:
+        """Take a time-limited lease on an active solution for a worker"""
+        now = datetime.now(timezone.utc)
+        with transaction() as conn:
+            row = conn.execute(
+                "SELECT status, lease_owner, lease_expires_at FROM solutions WHERE id = ?", (solution_id,)
+            ).fetchone()
+            if row is None or row['status'] not in active_statuses:
+                return False
+            if (row['lease_owner'] and row['lease_owner'] != owner and row['lease_expires_at']
+                    and datetime.fromisoformat(row['lease_expires_at']) > now):
+                return False
+            conn.execute(
+                "UPDATE solutions SET lease_owner = ?, lease_expires_at = ? WHERE id = ?",
+                (owner, (now + timedelta(seconds=lease_seconds)).isoformat(), solution_id)
+            )
+            return True
+
+    def renew_lease(self, solution_id: str, owner: str, lease_seconds: float):
+        """Extend a worker's lease on a solution"""
+        with transaction() as conn:
+            conn.execute(
+                "UPDATE solutions SET lease_owner = ?, lease_expires_at = ? WHERE id = ?",
+                (owner, (datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)).isoformat(), solution_id)
+            )
+
+class SQLiteQuestion(QuestionStore):
+    def _from_row(self, row: sqlite3.Row, include_embedding: bool = True) -> Dict[str, Any]:
+        data = {
+            'id': row['id'],
+            'text': row['text'],
+            'solution_id': row['solution_id'],
+            'inventory_id': row['inventory_id'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        }
+        if include_embedding:
+            data['embedding'] = to_list(row['embedding'])
+        return data
+
+    def _insert(self, conn: sqlite3.Connection, question_id: str, question_data: Dict[str, Any]) -> Dict[str, Any]:
+        now = _now()
+        document = {**question_data, 'created_at': now, 'updated_at': now}
+        conn.execute(
+            "INSERT INTO questions (id, text, solution_id, inventory_id, embedding, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (question_id, document.get('text'), document.get('solution_id'), document.get('inventory_id'),
+             _encode_embedding(document.get('embedding')), now, now)
+        )
+        return document
+
+    def create(self, question_data: Dict[str, Any]) -> str:
+        """Create a new question with embedding"""
+        question_id = uuid.uuid4().hex
+        with transaction() as conn:
+            document = self._insert(conn, question_id, question_data)
+        self._on_created(question_id, document)
+        return question_id
+
+    def get(self, question_id: str) -> Optional[Dict[str, Any]]:
+        """Get a question by ID"""
+        rows = query("SELECT * FROM questions WHERE id = ?", (question_id,))
+        return self._from_row(rows[0]) if rows else None
+
+    def iter_page(self, limit: Optional[int] = None, after: Optional[str] = None,
+                  include_embedding: bool = False) -> Iterator[Dict[str, Any]]:
+        """Stream questions newest first; embeddings are only read when requested"""
+        columns = "text, solution_id, inventory_id, updated_at" + (", embedding" if include_embedding else "")
+        for row in iter_rows('questions', columns, limit, after):
+            yield self._from_row(row, include_embedding)
+
+    def _iter_embeddings(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for row in iter_rows('questions', "text, solution_id, inventory_id, updated_at, embedding"):
+            data = self._from_row(row, include_embedding=False)
+            data['embedding'] = as_vector(row['embedding'])
+            yield row['id'], data
+
+    def migrate_embeddings(self, storage_format: Optional[str] = None) -> Dict[str, int]:
+        """Rewrite raw float32 embeddings as compact blobs, one transaction per chunk"""
+        migrated = skipped = 0
+        for rows in _chunks(query("SELECT id FROM questions WHERE embedding IS NOT NULL"), CHUNK_SIZE):
+            with transaction() as conn:
+                for row in rows:
+                    blob = conn.execute("SELECT embedding FROM questions WHERE id = ?", (row['id'],)).fetchone()['embedding']
+                    if is_encoded(blob):
+                        skipped += 1
+                        continue
+                    conn.execute("UPDATE questions SET embedding = ? WHERE id = ?",
+                                 (encode(as_vector(blob), storage_format), row['id']))
+                    migrated += 1
+        return {'migrated': migrated, 'skipped': skipped}
+
+    def find_by_solution(self, solution_id: str) -> List[str]:
+        """Get the IDs of the questions linked to a solution"""
+        return [row['id'] for row in query("SELECT id FROM questions WHERE solution_id = ?", (solution_id,))]
+
+    def delete(self, question_id: str) -> bool:
+        """Delete a question by ID"""
+        try:
+            with transaction() as conn:
+                conn.execute("DELETE FROM questions WHERE id = ?", (question_id,))
+            self.index.remove(question_id)
+            self.lexical.remove(question_id)
+            return True
+        except sqlite3.Error as e:
+            print(f"Error deleting question: {str(e)}")
+            return False
+
+class SQLiteInventory(InventoryStore):
+    def _from_row(self, row: sqlite3.Row) -> Dict[str, Any]:
+        data = json.loads(row['data'])
+        data['id'] = row['id']
+        data['created_at'] = row['created_at']
+        data['updated_at'] = row['updated_at']
+        return data
+
+    def _insert(self, conn: sqlite3.Connection, inventory_id: str, inventory_data: Dict[str, Any]):
+        now = _now()
+        data = {key: value for key, value in inventory_data.items() if key not in ('id', 'created_at', 'updated_at')}
+        conn.execute(
+            "INSERT OR REPLACE INTO inventory (id, data, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (inventory_id, _dumps(data), now, now)
+        )
+
+    def create(self, inventory_data: Dict[str, Any]) -> str:
+        """Create a new inventory item"""
+        inventory_id = uuid.uuid4().hex
+        with transaction() as conn:
+            self._insert(conn, inventory_id, inventory_data)
+        return inventory_id
+
+    def get(self, inventory_id: str) -> Optional[Dict[str, Any]]:
+        """Get an inventory item by ID"""
+        rows = query("SELECT * FROM inventory WHERE id = ?", (inventory_id,))
+        return self._from_row(rows[0]) if rows else None
+
+    def get_multiple(self, inventory_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get multiple inventory items by their IDs in one query"""
+        if not inventory_ids:
+            return []
+        rows = query(f"SELECT * FROM inventory WHERE id IN ({_placeholders(inventory_ids)})", tuple(inventory_ids))
+        found = {row['id']: self._from_row(row) for row in rows}
+        return [found[inventory_id] for inventory_id in inventory_ids if inventory_id in found]
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        """Get all inventory items"""
+        return [self._from_row(row) for row in iter_rows('inventory', 'data, updated_at')]
+
+    def delete(self, inventory_id: str) -> bool:
+        """Delete an inventory item by ID"""
+        try:
+            with transaction() as conn:
+                conn.execute("DELETE FROM inventory WHERE id = ?", (inventory_id,))
+            return True
+        except sqlite3.Error as e:
+            print(f"Error deleting inventory item: {str(e)}")
+            return False
+
+def delete_solution_cascade(solution_id: str, inventory_id: Optional[str] = None) -> bool:
+    """Delete a solution together with its inventory item and questions in one transaction"""
+    try:
+        with transaction() as conn:
+            question_ids = [row['id'] for row in
+                            conn.execute("SELECT id FROM questions WHERE solution_id = ?", (solution_id,))]
+            conn.execute("DELETE FROM questions WHERE solution_id = ?", (solution_id,))
+            if inventory_id:
+                conn.execute("DELETE FROM inventory WHERE id = ?", (inventory_id,))
+            conn.execute("DELETE FROM solutions WHERE id = ?", (solution_id,))
+    except sqlite3.Error as e:
+        print(f"Error deleting solution {solution_id}: {str(e)}")
+        return False
+
+    for question_id in question_ids:
+        questions.index.remove(question_id)
+        questions.lexical.remove(question_id)
+    return True
+
+def commit_investigation(solution_id: str, solution_data: Dict[str, Any],
+                         inventory_data: Dict[str, Any], question_data: Dict[str, Any]) -> Tuple[str, str]:
+    """Atomically store the results of an investigation in one transaction.
+
+    Returns the new inventory and question IDs.
+    """
+    # Same layout as the Firestore backend: the inventory item is keyed by solution ID
+    inventory_id = solution_id
+    question_id = uuid.uuid4().hex
+    solution_data['inventory_id'] = inventory_id
+
+    with transaction() as conn:
+        inventory._insert(conn, inventory_id, inventory_data)
+        question_document = questions._insert(conn, question_id, {
+            **question_data,
+            'solution_id': solution_id,
+            'inventory_id': inventory_id,
+        })
+        solutions._update_in(conn, solution_id, solution_data)
+
+    questions._on_created(question_id, question_document, solution_data)
+    return inventory_id, question_id
+
+def get_solution_with_inventory(solution_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Get a solution and its inventory item"""
+    solution = solutions.get(solution_id)
+    inventory_id = solution.get('inventory_id') if solution else None
+    return solution, inventory.get(inventory_id) if inventory_id else None
+
+def attach_inventory(solution_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Add each solution's inventory item under 'inventory', using one query"""
+    inventory_ids = list({solution['inventory_id'] for solution in solution_list if solution.get('inventory_id')})
+    items = {item['id']: item for item in inventory.get_multiple(inventory_ids)}
+    for solution in solution_list:
+        solution['inventory'] = items.get(solution.get('inventory_id'))
+    return solution_list
+
+def cache_stats() -> Dict[str, Any]:
+    """Local reads are not cached, so there are no counters to report"""
+    return {}
+
+# Create instances for global use
+solutions = SQLiteSolution()
+questions = SQLiteQuestion(solutions)
+inventory = SQLiteInventory()
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+
+class StatusBroker:
+    """In-process pub/sub for investigation status changes, keyed by solution ID.
+
+    `publish` is thread-safe so it can be called from the event loop, from
+    worker threads and from Firestore snapshot callbacks alike.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = defaultdict(list)
+
+    def subscribe(self, solution_id: str) -> asyncio.Queue:
+        """Register a queue that receives every status published for the solution."""
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers[solution_id].append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, solution_id: str, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = [entry for entry in self._subscribers.get(solution_id, []) if entry[1] is not queue]
+            if subscribers:
+                self._subscribers[solution_id] = subscribers
+            else:
+                self._subscribers.pop(solution_id, None)
+
+    def publish(self, solution_id: str, status: str):
+        """Deliver a status to all current subscribers of the solution."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(solution_id, []))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, status)
+            except RuntimeError:
+                # The subscriber's loop has been closed
+                self.unsubscribe(solution_id, queue)
+
+    def subscriber_count(self, solution_id: str) -> int:
+        with self._lock:
+            return len(self._subscribers.get(solution_id, []))
+
+
+status_broker = StatusBroker()
@@ -0,0 +1,326 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from similarity_index import SimilarityIndex
+from lexical_index import LexicalIndex
+from embedding_codec import as_vector
+from utils import serialize_datetime
+from datetime import datetime, timedelta, timezone
+import os
+import threading
+import time
+
+# Similarity index backend: "numpy" (exact, in memory) or "qdrant" (HNSW on the server at QDRANT_URL)
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "numpy").lower()
+
+
+def make_index():
+    if VECTOR_INDEX == "qdrant":
+        from vector_db_client import QDRANT_URL, QdrantIndex
+        if not QDRANT_URL:
+            # Embedded Qdrant ignores HNSW and payload indexes and scans in Python
+            print("Warning: VECTOR_INDEX=qdrant without QDRANT_URL uses local mode, an exact "
+                  "brute-force search slower than the numpy index; set QDRANT_URL for ANN search")
+        return QdrantIndex()
+    if VECTOR_INDEX == "numpy":
+        return SimilarityIndex()
+    raise ValueError(f"Unknown VECTOR_INDEX: {VECTOR_INDEX!r} (expected 'qdrant' or 'numpy')")
+
+
+class SolutionStore(ABC):
+    """Storage interface for solution documents"""
+
+    @abstractmethod
+    def create(self, solution_data: Dict[str, Any]) -> str: ...
+
+    @abstractmethod
+    def get(self, solution_id: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def get_many(self, solution_ids: List[str]) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def iter_page(self, limit: Optional[int] = None, after: Optional[str] = None) -> Iterator[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def list_recent(self, limit: int = 5) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def update(self, solution_id: str, solution_data: Dict[str, Any]) -> bool: ...
+
+    @abstractmethod
+    def delete(self, solution_id: str) -> bool: ...
+
+    @abstractmethod
+    def list_by_status(self, statuses: List[str]) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def find_active_by_key(self, question_key: str, statuses: List[str]) -> Optional[str]: ...
+
+    @abstractmethod
+    def claim(self, solution_id: str, owner: str, lease_seconds: float, active_statuses: List[str]) -> bool: ...
+
+    @abstractmethod
+    def renew_lease(self, solution_id: str, owner: str, lease_seconds: float): ...
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        """Get all solutions"""
+        return list(self.iter_page())
+
+    def list_page(self, limit: int, after: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get one page of solutions and the cursor for the next page (None on the last page)"""
+        items = list(self.iter_page(limit, after))
+        next_cursor = items[-1]['id'] if len(items) == limit else None
+        return items, next_cursor
+
+    def invalidate(self, solution_id: str):
+        """Drop a solution from any read cache"""
+
+    def watch(self, solution_id: str, callback: Callable[[Optional[Dict[str, Any]]], None]) -> Callable[[], None]:
+        """Listen for changes made by other instances; backends without that capability never call back"""
+        return lambda: None
+
+
+class QuestionStore(ABC):
+    """Storage interface for questions, with a similarity index over their embeddings
+    and a BM25 index over their text and their solution's identifying fields"""
+
+    # Seconds before the similarity index is reloaded from storage (0 = load
+    # once per process). Backends that can listen for changes keep the index
+    # current with writes from other instances without reloading.
+    INDEX_REFRESH_SECONDS = float(os.getenv("QUESTION_INDEX_REFRESH_SECONDS", "0"))
+    # Fields returned by listings that leave out the embedding
+    SUMMARY_FIELDS = ['text', 'solution_id', 'inventory_id', 'created_at', 'updated_at']
+    # Solution fields indexed lexically alongside the question text
+    LEXICAL_SOLUTION_FIELDS = ['error_code', 'model_number', 'manufacturer']
+    # How far a full lexical match pulls the vector score towards 1 (0 = vector only)
+    HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "0.3"))
+    # Candidates taken from each index per requested result before fusing
+    HYBRID_CANDIDATE_FACTOR = 4
+    # How far before an index load the change listener starts, to cover clock skew
+    WATCH_OVERLAP_SECONDS = 60
+
+    def __init__(self, solution_store: Optional[SolutionStore] = None):
+        self.THRESHOLD = 0.8  # Similarity threshold
+        self.solution_store = solution_store
+        self._index = None
+        self.lexical = LexicalIndex()
+        self._index_lock = threading.Lock()
+        self._index_loaded_at = None
+        self._unwatch = None
+
+    @property
+    def index(self):
+        # Created on first use so importing the stores does not load the vector index backend
+        if self._index is None:
+            self._index = make_index()
+        return self._index
+
+    @index.setter
+    def index(self, value):
+        self._index = value
+
+    @abstractmethod
+    def create(self, question_data: Dict[str, Any]) -> str: ...
+
+    @abstractmethod
+    def get(self, question_id: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def iter_page(self, limit: Optional[int] = None, after: Optional[str] = None,
+                  include_embedding: bool = False) -> Iterator[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def find_by_solution(self, solution_id: str) -> List[str]: ...
+
+    @abstractmethod
+    def delete(self, question_id: str) -> bool: ...
+
+    @abstractmethod
+    def migrate_embeddings(self, storage_format: Optional[str] = None) -> Dict[str, int]:
+        """Rewrite embeddings stored in a legacy layout as compact blobs"""
+
+    @abstractmethod
+    def _iter_embeddings(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (id, data) for every stored question, including its embedding"""
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        """Get all questions"""
+        return list(self.iter_page(include_embedding=True))
+
+    def list_page(self, limit: int, after: Optional[str] = None,
+                  include_embedding: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get one page of questions and the cursor for the next page (None on the last page)"""
+        items = list(self.iter_page(limit, after, include_embedding))
+        next_cursor = items[-1]['id'] if len(items) == limit else None
+        return items, next_cursor
+
+    def _index_payload(self, question_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        payload = {key: value for key, value in data.items() if key != 'embedding'}
+        payload['id'] = question_id
+        # Ensure solution_id is a string
+        if 'solution_id' in payload:
+            payload['solution_id'] = str(payload['solution_id'])
+        return serialize_datetime(payload)
+
+    def _lexical_texts(self, question: Dict[str, Any], solution: Optional[Dict[str, Any]]) -> List[str]:
+        texts = [question.get('text') or '']
+        for field in self.LEXICAL_SOLUTION_FIELDS:
+            value = (solution or {}).get(field)
+            if isinstance(value, str) and value.strip().upper() != 'N/A':
+                texts.append(value)
+        return texts
+
+    def _watch_questions(self, since: datetime) -> Optional[Callable[[], None]]:
+        """Start applying questions written elsewhere since `since` to the indexes.
+
+        Backends that support change listeners call `_on_changed` and
+        `_on_removed` from the listener and return a function that stops it.
+        """
+        return None
+
+    def _on_changed(self, question_id: str, document: Dict[str, Any]):
+        """Index a question created or updated by any instance"""
+        solution = None
+        if self.solution_store is not None and document.get('solution_id'):
+            solution = self.solution_store.get(str(document['solution_id']))
+        self._on_created(question_id, document, solution)
+
+    def _on_removed(self, question_id: str):
+        self.index.remove(question_id)
+        self.lexical.remove(question_id)
+
+    def _on_created(self, question_id: str, document: Dict[str, Any], solution: Optional[Dict[str, Any]] = None):
+        """Keep the similarity and lexical indexes in step with a newly written question"""
+        if self._index_loaded_at is None:
+            return
+        if document.get('embedding') is not None:
+            self.index.add(question_id, as_vector(document['embedding']), self._index_payload(question_id, document))
+        self.lexical.add(question_id, self._lexical_texts(document, solution))
+
+    def _build_lexical(self, payloads: List[Dict[str, Any]]) -> LexicalIndex:
+        lexical = LexicalIndex()
+        solution_ids = list({payload['solution_id'] for payload in payloads if payload.get('solution_id')})
+        found = {}
+        if self.solution_store is not None:
+            for start in range(0, len(solution_ids), 100):
+                for solution in self.solution_store.get_many(solution_ids[start:start + 100]):
+                    found[solution['id']] = solution
+        for payload in payloads:
+            lexical.add(payload['id'], self._lexical_texts(payload, found.get(payload.get('solution_id'))))
+        return lexical
+
+    def _indexable(self) -> Iterator[Tuple[str, Any, Dict[str, Any]]]:
+        for question_id, data in self._iter_embeddings():
+            if data.get('embedding') is not None:
+                yield question_id, as_vector(data['embedding']), self._index_payload(question_id, data)
+
+    def _load_index(self):
+        """Bring the similarity index in line with storage.
+
+        A persistent index is synced in place; an in-memory one is rebuilt
+        from every stored embedding and swapped in. The first load also
+        starts the backend's change listener, from a little before the load
+        so questions written while it runs are not missed.
+        """
+        started = datetime.now(timezone.utc) - timedelta(seconds=self.WATCH_OVERLAP_SECONDS)
+        payloads = []
+
+        def indexable():
+            for question_id, embedding, payload in self._indexable():
+                payloads.append(payload)
+                yield question_id, embedding, payload
+
+        if getattr(self.index, 'persistent', False):
+            result = self.index.sync(indexable())
+            print(f"Synced question embeddings into similarity index: {result}")
+        else:
+            index = SimilarityIndex()
+            for question_id, embedding, payload in indexable():
+                index.add(question_id, embedding, payload)
+            self.index = index
+            print(f"Loaded {len(self.index)} question embeddings into similarity index")
+        self.lexical = self._build_lexical(payloads)
+        self._index_loaded_at = time.monotonic()
+        if self._unwatch is None:
+            self._unwatch = self._watch_questions(started)
+
+    def sync_index(self):
+        """Backfill the similarity index from storage now"""
+        with self._index_lock:
+            self._load_index()
+        return len(self.index)
+
+    def ensure_index(self):
+        """Load the similarity index on first use, or again once the refresh interval expires"""
+        with self._index_lock:
+            expired = (self.INDEX_REFRESH_SECONDS > 0 and self._index_loaded_at is not None
+                       and time.monotonic() - self._index_loaded_at > self.INDEX_REFRESH_SECONDS)
+            if self._index_loaded_at is None or expired:
+                self._load_index()
+        return self.index
+
+    def find_similar(self, embedding, limit: int = 5, min_score: float = 0.75,
+                     query_text: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Find most similar questions using cosine similarity, boosted by BM25 when query_text is given.
+
+        The fused score is `cosine + w * bm25 * (1 - cosine)`: a lexical match
+        moves a candidate towards 1 but never below its vector score, so
+        thresholds keep their meaning.
+
+        Args:
+            embedding: The query embedding to compare against
+            limit: Maximum number of results to return (default: 5)
+            min_score: Minimum similarity score to include in results (default: 0.75)
+            query_text: The query text for lexical matching (default: vector only)
+
+        Returns:
+            List of matches sorted by similarity score (highest first)
+        """
+        index = self.ensure_index()
+        weight = self.HYBRID_LEXICAL_WEIGHT
+        if not query_text or weight <= 0:
+            hits = index.search(embedding, limit=limit, min_score=min_score)
+            return [{**payload, 'score': score} for _, score, payload in hits]
+
+        candidates = limit * self.HYBRID_CANDIDATE_FACTOR
+        # Lowest cosine that a full lexical match could still lift to min_score
+        vector_floor = (min_score - weight) / (1 - weight) if weight < 1 else 0.0
+        vector_hits = {item_id: (score, payload) for item_id, score, payload
+                       in index.search(embedding, limit=candidates, min_score=vector_floor)}
+        lexical_hits = dict(self.lexical.search(query_text, limit=candidates, candidates=vector_hits))
+
+        missing = [item_id for item_id in lexical_hits if item_id not in vector_hits]
+        if missing:
+            for item_id, score, payload in index.score_ids(embedding, missing):
+                vector_hits[item_id] = (score, payload)
+
+        matches = []
+        for item_id, (vector_score, payload) in vector_hits.items():
+            lexical_score = lexical_hits.get(item_id, 0.0)
+            score = vector_score + weight * lexical_score * (1 - max(vector_score, 0.0))
+            if score >= min_score:
+                matches.append({**payload, 'score': score, 'vector_score': vector_score, 'lexical_score': lexical_score})
+        matches.sort(key=lambda match: match['score'], reverse=True)
+        return matches[:limit]
+
+
+class InventoryStore(ABC):
+    """Storage interface for inventory items"""
+
+    @abstractmethod
+    def create(self, inventory_data: Dict[str, Any]) -> str: ...
+
+    @abstractmethod
+    def get(self, inventory_id: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def get_multiple(self, inventory_ids: List[str]) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def list_all(self) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def delete(self, inventory_id: str) -> bool: ...
+
+    def invalidate(self, inventory_id: str):
+        """Drop an inventory item from any read cache"""
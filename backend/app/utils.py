@@ -1,24 +1,99 @@
-import vertexai
-from vertexai.language_models import TextEmbeddingModel
 from datetime import datetime
 import json
+import os
+import threading
 from typing import Dict, Any, List
+from embedding_cache import EmbeddingCache, cache_key
+from metrics import EMBEDDING_SECONDS, EMBEDDING_TEXTS, timed
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-005")
+# Per-request limits of the Vertex AI text embedding API
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "250"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "20000"))
+
+
+_model = None
+_model_lock = threading.Lock()
 
 
 def initialize_vertex_ai():
-    vertexai.init()
-    return TextEmbeddingModel.from_pretrained("text-embedding-005")
+    # Imported here: the Vertex AI SDK is slow to import and only needed for embeddings
+    import vertexai
+    from vertexai.language_models import TextEmbeddingModel
+
+    vertexai.init(
+        project=os.getenv('GOOGLE_CLOUD_PROJECT'),
+        location=os.getenv('VERTEXAI_LOCATION', 'us-central1'),
+    )
+    return TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
+
+
+def get_embedding_model():
+    """Return the embedding model, loading it on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = initialize_vertex_ai()
+    return _model
+
+embedding_cache = EmbeddingCache(
+    os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3") or None,
+    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _pack_batches(texts: List[str]) -> List[List[str]]:
+    """Group texts into as few requests as the embedding API allows."""
+    batches = []
+    current, current_tokens = [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= EMBEDDING_BATCH_SIZE or current_tokens + tokens > EMBEDDING_BATCH_TOKENS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed a list of texts, only sending cache misses to the model."""
+    keys = [cache_key(EMBEDDING_MODEL, text) for text in texts]
+    cached = embedding_cache.get_many(keys)
+
+    misses = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in misses:
+            misses[key] = text
+    EMBEDDING_TEXTS.labels(source="cache").inc(len(texts) - len(misses))
+    EMBEDDING_TEXTS.labels(source="model").inc(len(misses))
 
+    if misses:
+        fetched = {}
+        miss_keys = list(misses.keys())
+        offset = 0
+        for batch in _pack_batches(list(misses.values())):
+            with timed(EMBEDDING_SECONDS):
+                embeddings = get_embedding_model().get_embeddings(batch)
+            for key, embedding in zip(miss_keys[offset:offset + len(batch)], embeddings):
+                fetched[key] = embedding.values
+            offset += len(batch)
+        embedding_cache.put_many(fetched)
+        cached.update(fetched)
 
-# Initialize the model
-model = initialize_vertex_ai()
+    return [cached.get(key, []) for key in keys]
 
 
 def embed_text(text):
-    embeddings = model.get_embeddings([text])
-    if embeddings and len(embeddings) > 0:
-        return embeddings[0].values
-    return []
+    return embed_texts([text])[0]
 
 
 def parse_json_field(data: Dict[str, Any], field: str) -> List[Any]:
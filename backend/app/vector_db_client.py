@@ -1,32 +1,198 @@
 from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct
+from qdrant_client.models import (
+    Distance, Filter, HasIdCondition, HnswConfigDiff, PayloadSchemaType, PointIdsList, PointStruct, SearchParams, VectorParams,
+)
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+import threading
 import uuid
-client = QdrantClient(path="./qdrant_data")  # Use `localhost` or docker for persistent
-
-COLLECTION = "questions"
-DIM = 384  # Same as your embedding dimension
-THRESHOLD=0.8
-
-# Initialize only once, not on every request
-if not client.collection_exists(COLLECTION):
-    client.recreate_collection(collection_name=COLLECTION, vectors_config={"size": DIM, "distance": "Cosine"})
-
-def add_to_qdrant(text, embedding, solution_id):
-    point_id = uuid.uuid4().int >> 64
-    print(f"Adding point with id {point_id}")
-    client.upsert(
-        collection_name=COLLECTION,
-        points=[PointStruct(id=point_id, vector=embedding, payload={"text": text, "solution_id": solution_id})]
-    )
-
-def search_similar(embedding):
-
-    # Else fallback to vector search
-    points = client.scroll(collection_name=COLLECTION, with_vectors=False)
-    print(f"Points in collection: {points}")
-    hits = client.search(collection_name=COLLECTION, query_vector=embedding, limit=1)
-    print(hits)
-    if hits and hits[0].score >= THRESHOLD:
-        return {**hits[0].payload, "score": hits[0].score}
-
-    return None
\ No newline at end of file
+
+# Set QDRANT_URL to a Qdrant server; only the server builds HNSW and payload
+# indexes. Without it the client falls back to local path mode, which is an
+# exact brute-force search and takes an exclusive lock on the directory, so
+# it only suits single-process tests and benchmarks.
+QDRANT_PATH = os.getenv("QDRANT_PATH", "./qdrant_data")
+QDRANT_URL = os.getenv("QDRANT_URL")
+
+COLLECTION = os.getenv("QDRANT_COLLECTION", "questions")
+DIM = int(os.getenv("EMBEDDING_DIMENSION", "768"))  # text-embedding-005
+# HNSW graph parameters: edges per node, build-time and query-time beam width
+HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "128"))
+# Points per upsert request during a sync
+SYNC_BATCH_SIZE = 256
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> QdrantClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = QdrantClient(url=QDRANT_URL) if QDRANT_URL else QdrantClient(path=QDRANT_PATH)
+    return _client
+
+def point_id(item_id: str) -> str:
+    """Qdrant only accepts integers and UUIDs as point IDs, so derive a stable UUID from the question ID"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, item_id))
+
+
+class QdrantIndex:
+    """Approximate nearest-neighbor index over question embeddings, stored in Qdrant.
+
+    Exposes the same add/remove/search interface as SimilarityIndex. Points
+    persist across restarts, so `sync` only writes the difference between the
+    collection and the questions in the database.
+    """
+
+    persistent = True
+
+    def __init__(self, collection: str = COLLECTION, dimension: int = DIM):
+        self.collection = collection
+        self._dimension = dimension
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    @property
+    def client(self) -> QdrantClient:
+        self._ensure_collection()
+        return get_client()
+
+    def _create_collection(self, client: QdrantClient):
+        client.create_collection(
+            collection_name=self.collection,
+            vectors_config=VectorParams(size=self._dimension, distance=Distance.COSINE),
+            hnsw_config=HnswConfigDiff(m=HNSW_M, ef_construct=HNSW_EF_CONSTRUCT),
+        )
+        client.create_payload_index(self.collection, field_name="solution_id", field_schema=PayloadSchemaType.KEYWORD)
+
+    def _ensure_collection(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            client = get_client()
+            if client.collection_exists(self.collection):
+                size = client.get_collection(self.collection).config.params.vectors.size
+                if size != self._dimension:
+                    # Built for a different embedding model; sync repopulates it
+                    print(f"Recreating Qdrant collection {self.collection}: dimension {size} != {self._dimension}")
+                    client.delete_collection(self.collection)
+                    self._create_collection(client)
+            else:
+                self._create_collection(client)
+            self._ready = True
+
+    def __len__(self) -> int:
+        return self.client.count(self.collection, exact=True).count
+
+    def _point(self, item_id: str, embedding, payload: Optional[Dict[str, Any]]) -> Optional[PointStruct]:
+        vector = [float(value) for value in embedding]
+        if len(vector) != self._dimension:
+            print(f"Skipping embedding {item_id}: dimension {len(vector)} != {self._dimension}")
+            return None
+        return PointStruct(id=point_id(item_id), vector=vector, payload={**(payload or {}), 'id': item_id})
+
+    def add(self, item_id: str, embedding, payload: Optional[Dict[str, Any]] = None) -> bool:
+        """Add or replace a single embedding. Returns False if it was skipped."""
+        point = self._point(item_id, embedding, payload)
+        if point is None:
+            return False
+        self.client.upsert(self.collection, points=[point], wait=True)
+        return True
+
+    def add_many(self, items: Iterable[Tuple[str, Any, Optional[Dict[str, Any]]]]) -> int:
+        """Upsert (id, embedding, payload) tuples in batches. Returns the number written."""
+        written = 0
+        batch = []
+        for item_id, embedding, payload in items:
+            point = self._point(item_id, embedding, payload)
+            if point is not None:
+                batch.append(point)
+            if len(batch) >= SYNC_BATCH_SIZE:
+                self.client.upsert(self.collection, points=batch, wait=True)
+                written += len(batch)
+                batch = []
+        if batch:
+            self.client.upsert(self.collection, points=batch, wait=True)
+            written += len(batch)
+        return written
+
+    def remove(self, item_id: str) -> bool:
+        self.client.delete(self.collection, points_selector=PointIdsList(points=[point_id(item_id)]), wait=True)
+        return True
+
+    def clear(self):
+        with self._lock:
+            client = get_client()
+            if client.collection_exists(self.collection):
+                client.delete_collection(self.collection)
+            self._create_collection(client)
+            self._ready = True
+
+    def ids(self) -> Iterator[str]:
+        """Yield the question ID of every stored point"""
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                self.collection, limit=SYNC_BATCH_SIZE, offset=offset,
+                with_payload=['id'], with_vectors=False,
+            )
+            for point in points:
+                if point.payload and 'id' in point.payload:
+                    yield point.payload['id']
+            if offset is None:
+                return
+
+    def sync(self, items: Iterable[Tuple[str, Any, Optional[Dict[str, Any]]]]) -> Dict[str, int]:
+        """Make the collection match `items`: upsert missing points and delete points no longer in the database"""
+        existing = set(self.ids())
+        seen = set()
+
+        def missing():
+            for item_id, embedding, payload in items:
+                seen.add(item_id)
+                if item_id not in existing:
+                    yield item_id, embedding, payload
+
+        added = self.add_many(missing())
+        stale = [point_id(item_id) for item_id in existing - seen]
+        for start in range(0, len(stale), SYNC_BATCH_SIZE):
+            self.client.delete(self.collection, points_selector=PointIdsList(points=stale[start:start + SYNC_BATCH_SIZE]), wait=True)
+        return {'added': added, 'removed': len(stale), 'total': len(seen)}
+
+    def search(self, embedding, limit: int = 5, min_score: float = 0.0) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """Return up to `limit` (id, score, payload) tuples, highest score first."""
+        vector = [float(value) for value in embedding]
+        if limit <= 0 or len(vector) != self._dimension:
+            return []
+        response = self.client.query_points(
+            self.collection, query=vector, limit=limit, score_threshold=min_score,
+            search_params=SearchParams(hnsw_ef=HNSW_EF), with_payload=True,
+        )
+        return [(hit.payload.get('id'), hit.score, hit.payload) for hit in response.points]
+
+    def score_ids(self, embedding, item_ids: List[str]) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """Return (id, score, payload) for the given IDs that are in the index."""
+        vector = [float(value) for value in embedding]
+        if not item_ids or len(vector) != self._dimension:
+            return []
+        response = self.client.query_points(
+            self.collection, query=vector, limit=len(item_ids), with_payload=True,
+            query_filter=Filter(must=[HasIdCondition(has_id=[point_id(item_id) for item_id in item_ids])]),
+            search_params=SearchParams(exact=True),
+        )
+        return [(hit.payload.get('id'), hit.score, hit.payload) for hit in response.points]
+
+
+if __name__ == "__main__":
+    # Backfill: python vector_db_client.py
+    from db import questions
+    print(questions.sync_index())
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+# Initialize clients in the background after startup instead of on the first request
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+
+def _import_researcher():
+    import gpt_researcher  # noqa: F401
+
+
+def _steps() -> List[Tuple[str, Callable[[], Any]]]:
+    from db import init, questions
+    from llm_model import get_client
+    from utils import get_embedding_model
+    return [
+        ("database", init),
+        ("gemini", get_client),
+        ("embedding_model", get_embedding_model),
+        ("similarity_index", questions.ensure_index),
+        ("gpt_researcher", _import_researcher),
+    ]
+
+
+class WarmUp:
+    """Background initialization of the heavy clients, with per-step readiness."""
+
+    def __init__(self):
+        self.enabled = WARMUP_ON_STARTUP
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.finished = False
+
+    @property
+    def ready(self) -> bool:
+        if not self.enabled:
+            return True
+        return self.finished and all(step["status"] == "ready" for step in self.steps.values())
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "warmup_enabled": self.enabled, "steps": self.steps}
+
+    async def run(self):
+        """Run each step in a worker thread, one at a time, recording its duration or error."""
+        for name, _ in _steps():
+            self.steps[name] = {"status": "pending"}
+        for name, step in _steps():
+            self.steps[name] = {"status": "running"}
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(step)
+                self.steps[name] = {"status": "ready", "seconds": round(time.perf_counter() - started, 3)}
+            except Exception as e:
+                print(f"Warm-up step {name} failed: {str(e)}")
+                self.steps[name] = {"status": "error", "error": str(e)}
+        self.finished = True
+
+    def start(self):
+        if self.enabled:
+            asyncio.create_task(self.run())
+
+
+warmup = WarmUp()
@@ -0,0 +1,186 @@
+"""Deterministic local stand-ins for Gemini, Vertex AI embeddings and GPT Researcher.
+
+`install()` registers fake `google.genai`, `vertexai` and `gpt_researcher`
+modules in sys.modules, so it must run before the application first imports
+those SDKs. Storage
+runs on the SQLite backend; `inject_latency` wraps store methods to model
+Firestore round-trips.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sys
+import time
+import types
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable
+
+import numpy as np
+
+
+@dataclass
+class Latency:
+    """Injected latency in seconds; each call sleeps `mean` +/- `jitter` * `mean`."""
+    llm: float = 0.0
+    embedding: float = 0.0
+    research: float = 0.0
+    storage: float = 0.0
+    jitter: float = 0.0
+
+    def sample(self, mean: float) -> float:
+        if mean <= 0:
+            return 0.0
+        return max(0.0, mean * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+latency = Latency()
+
+DIMENSION = 768
+
+
+def fake_embedding(text: str, dimension: int = None) -> np.ndarray:
+    """Unit vector seeded by the text, so equal texts always embed identically."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension or DIMENSION).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _value_for(schema: Dict[str, Any], name: str = "") -> Any:
+    kind = schema.get("type", "STRING").upper()
+    if kind == "OBJECT":
+        return {key: _value_for(value, key) for key, value in schema.get("properties", {}).items()}
+    if kind == "ARRAY":
+        return [_value_for(schema.get("items", {}), name) for _ in range(3)]
+    if kind == "BOOLEAN":
+        return False
+    if name == "url":
+        return "https://example.com/manual.pdf"
+    return f"Synthetic {name or 'value'}"
+
+
+def fake_text(prompt: str, response_schema: Dict[str, Any] = None) -> str:
+    """Plausible model output for each kind of prompt the application sends."""
+    if response_schema:
+        return json.dumps(_value_for(response_schema))
+    if "rewrites technician input" in prompt:
+        match = re.search(r"Input:\n(.*?)\n\s*Output:", prompt, re.S)
+        return (match.group(1) if match else prompt).strip()
+    if "confidence level from 0-100" in prompt:
+        return "85"
+    if "extract detailed component or machine information" in prompt:
+        return json.dumps({"manufacturer": "Siemens", "model_name": "S7-1500", "component_type": "PLC"})
+    return "Check the sensor wiring, reset the controller and verify the error clears. " * 8
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _AsyncModels:
+    async def generate_content(self, model: str, contents, config=None):
+        await asyncio.sleep(latency.sample(latency.llm))
+        return _Response(fake_text(_prompt_of(contents), getattr(config, "response_schema", None)))
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        text = fake_text(_prompt_of(contents))
+        chunks = [text[i:i + 80] for i in range(0, len(text), 80)]
+
+        async def stream():
+            for chunk in chunks:
+                await asyncio.sleep(latency.sample(latency.llm) / len(chunks))
+                yield _Response(chunk)
+        return stream()
+
+
+def _prompt_of(contents) -> str:
+    parts = getattr(contents[0], "parts", []) if contents else []
+    return "".join(getattr(part, "text", None) or "" for part in parts)
+
+
+class _AsyncCaches:
+    async def create(self, model: str, config=None):
+        await asyncio.sleep(latency.sample(latency.llm))
+        return types.SimpleNamespace(name=f"cachedContents/{uuid.uuid4().hex}")
+
+    async def delete(self, name: str):
+        return None
+
+
+class _Client:
+    def __init__(self, **kwargs):
+        self.aio = types.SimpleNamespace(models=_AsyncModels(), caches=_AsyncCaches())
+
+
+class _Type:
+    """Accepts any keyword arguments and exposes them as attributes, like the SDK's pydantic types."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _EmbeddingModel:
+    @classmethod
+    def from_pretrained(cls, name: str):
+        return cls()
+
+    def get_embeddings(self, texts: Iterable[str]):
+        # Called from a worker thread, like the blocking SDK
+        time.sleep(latency.sample(latency.embedding))
+        return [types.SimpleNamespace(values=fake_embedding(text).tolist()) for text in texts]
+
+
+class _GPTResearcher:
+    def __init__(self, query: str, report_type: str = "research_report", **kwargs):
+        self.query = query
+
+    async def conduct_research(self):
+        await asyncio.sleep(latency.sample(latency.research))
+
+    async def write_report(self) -> str:
+        await asyncio.sleep(latency.sample(latency.llm))
+        return f"# {self.query}\n\n" + fake_text(self.query)
+
+
+def _module(name: str, **attributes) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def install(dimension: int = DIMENSION):
+    """Register the fake SDK modules. Call before importing the application."""
+    global DIMENSION
+    DIMENSION = dimension
+
+    genai_types = _module("google.genai.types", **{
+        name: type(name, (_Type,), {})
+        for name in ("Part", "Blob", "Content", "GenerateContentConfig", "SafetySetting",
+                     "ThinkingConfig", "CreateCachedContentConfig")
+    })
+    genai = _module("google.genai", Client=_Client, types=genai_types)
+    try:
+        import google
+    except ImportError:
+        google = _module("google", __path__=[])
+    google.genai = genai
+
+    language_models = _module("vertexai.language_models", TextEmbeddingModel=_EmbeddingModel)
+    _module("vertexai", init=lambda *args, **kwargs: None, language_models=language_models)
+
+    _module("gpt_researcher", GPTResearcher=_GPTResearcher)
+
+
+def inject_latency(store: Any, methods: Iterable[str]):
+    """Wrap store methods so each call first sleeps for the storage latency."""
+    for name in methods:
+        method = getattr(store, name)
+
+        def wrapped(*args, _method=method, **kwargs):
+            time.sleep(latency.sample(latency.storage))
+            return _method(*args, **kwargs)
+        setattr(store, name, wrapped)
@@ -0,0 +1,253 @@
+"""Offline load benchmark for the API.
+
+Runs the FastAPI app in-process against the SQLite storage backend, with
+deterministic fakes for Gemini, embeddings and GPT Researcher, and reports
+p50/p95/p99 latency and throughput per endpoint for each corpus size.
+
+Usage, from backend/:
+
+    python benchmarks/run.py --corpus 1000,10000,100000 --concurrency 16 --requests 200 \\
+        --llm-latency 0.8 --embedding-latency 0.05 --research-latency 5 --storage-latency 0.01
+
+Corpus sizes are seeded incrementally into one database, smallest first. The
+in-memory index holds 4 bytes per dimension per question, so 1M questions
+at 768 dimensions needs about 3 GB of RAM (or pass --dimension).
+
+Requires the application's dependencies except the Google Cloud SDKs and
+gpt-researcher, plus httpx.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+import fakes
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+MANUFACTURERS = ["Siemens", "ABB", "Fanuc", "Rockwell", "Schneider", "Omron", "Mitsubishi", "Bosch Rexroth"]
+MODELS = ["S7-1500", "ACS880", "R-30iB", "PowerFlex 755", "Altivar 320", "NX1P2", "FX5U", "IndraDrive C"]
+SYMPTOMS = [
+    "after a power cycle", "when the conveyor starts", "during homing", "at high speed",
+    "after a firmware update to v2.1.3", "intermittently on the night shift", "with the spindle loaded",
+]
+
+
+def synthetic_question(i: int) -> Dict[str, str]:
+    rng = random.Random(i)
+    index = rng.randrange(len(MANUFACTURERS))
+    fields = {
+        "manufacturer": MANUFACTURERS[index],
+        "model_number": MODELS[index],
+        "error_code": f"E{rng.randrange(10000):04d}",
+    }
+    fields["text"] = (f"{fields['manufacturer']} {fields['model_number']} shows error {fields['error_code']} "
+                      f"{rng.choice(SYMPTOMS)} (case {i})")
+    return fields
+
+
+def seed(sqlite_db, embedding_codec, start: int, stop: int, chunk: int = 5000):
+    """Bulk-insert complete solutions and their questions for corpus rows [start, stop)."""
+    base = datetime(2024, 1, 1)
+    for offset in range(start, stop, chunk):
+        solution_rows, question_rows = [], []
+        for i in range(offset, min(offset + chunk, stop)):
+            fields = synthetic_question(i)
+            created = (base + timedelta(seconds=i)).isoformat()
+            solution_id, question_id = f"s{i:08d}", f"q{i:08d}"
+            data = {
+                "title": fields["text"], "text": fakes.fake_text(fields["text"]), "status": "complete",
+                "confidence": "85", "verified": False, "solution_steps": ["Check wiring", "Reset controller"],
+                "error_code": fields["error_code"], "model_number": fields["model_number"],
+                "manufacturer": fields["manufacturer"], "inventory_id": None,
+            }
+            solution_rows.append((solution_id, json.dumps(data), "complete", None, created, created))
+            question_rows.append((question_id, fields["text"], solution_id, None,
+                                  embedding_codec.encode(fakes.fake_embedding(fields["text"])), created, created))
+        with sqlite_db.transaction() as conn:
+            conn.executemany("INSERT INTO solutions (id, data, status, question_key, created_at, updated_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", solution_rows)
+            conn.executemany("INSERT INTO questions (id, text, solution_id, inventory_id, embedding, created_at, updated_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", question_rows)
+        print(f"  seeded {min(offset + chunk, stop)}/{stop}", end="\r", flush=True)
+    print()
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.elapsed: Dict[str, float] = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def summary(self, corpus: int) -> List[Dict[str, float]]:
+        rows = []
+        for endpoint, values in self.latencies.items():
+            p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+            rows.append({
+                "corpus": corpus, "endpoint": endpoint, "requests": len(values),
+                "errors": self.errors[endpoint], "p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2),
+                "p99_ms": round(float(p99), 2), "rps": round(len(values) / self.elapsed[endpoint], 2),
+            })
+        return rows
+
+
+async def run_load(recorder: Recorder, endpoint: str, requests: int, concurrency: int, call):
+    """Issue `requests` calls of `call(i)` with at most `concurrency` in flight."""
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception as e:
+                print(f"  {endpoint} request failed: {e}")
+                ok = False
+            recorder.record(endpoint, time.perf_counter() - started, ok)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    recorder.elapsed[endpoint] = time.perf_counter() - started
+
+
+async def read_status_stream(client, solution_id: str) -> bool:
+    """Follow a status stream until its complete or error event."""
+    async with client.stream("GET", f"/api/v1/solutions/{solution_id}/status") as response:
+        async for line in response.aiter_lines():
+            if line.startswith("event:") and line.split(":", 1)[1].strip() in ("complete", "error"):
+                return line.split(":", 1)[1].strip() == "complete"
+    return False
+
+
+async def bench_corpus(client, corpus: int, args) -> List[Dict[str, float]]:
+    recorder = Recorder()
+    rng = random.Random(corpus)
+
+    def query(i: int) -> str:
+        # Half repeat a stored question, half are new
+        if i % 2 == 0:
+            return synthetic_question(rng.randrange(corpus))["text"]
+        return synthetic_question(corpus + 10_000_000 + i)["text"]
+
+    async def ask(i: int) -> bool:
+        response = await client.post("/api/v1/ask", json={"question": query(i)})
+        return response.status_code in (200, 204)
+
+    async def chat(i: int) -> bool:
+        response = await client.post("/api/v1/chat", json={"question": query(i)})
+        return response.status_code == 200
+
+    async def status(i: int) -> bool:
+        return await read_status_stream(client, f"s{rng.randrange(corpus):08d}")
+
+    async def investigate(i: int) -> bool:
+        question = f"Investigation {corpus}-{i}: " + synthetic_question(corpus + 20_000_000 + i)["text"]
+        started = time.perf_counter()
+        response = await client.post("/api/v1/investigate", json={"question": question})
+        recorder.record("investigate (submit)", time.perf_counter() - started, response.status_code == 200)
+        return response.status_code == 200 and await read_status_stream(client, response.json()["solution"]["id"])
+
+    await run_load(recorder, "ask", args.requests, args.concurrency, ask)
+    await run_load(recorder, "chat", args.requests, args.concurrency, chat)
+    await run_load(recorder, "status (complete)", args.requests, args.concurrency, status)
+    await run_load(recorder, "investigate (end to end)", args.investigations, args.concurrency, investigate)
+    recorder.elapsed["investigate (submit)"] = recorder.elapsed["investigate (end to end)"]
+    return recorder.summary(corpus)
+
+
+def print_table(rows: List[Dict[str, float]]):
+    columns = ["corpus", "endpoint", "requests", "errors", "p50_ms", "p95_ms", "p99_ms", "rps"]
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(str(row[column]).ljust(widths[column]) for column in columns))
+
+
+async def main(args):
+    import httpx
+    from main import app
+    import sqlite_db
+    import embedding_codec
+    from db import solutions, questions, inventory
+
+    for store, methods in (
+        (solutions, ["create", "get", "get_many", "update", "iter_page", "find_active_by_key", "claim", "renew_lease"]),
+        (questions, ["create", "get", "iter_page", "find_by_solution"]),
+        (inventory, ["create", "get", "get_multiple"]),
+    ):
+        fakes.inject_latency(store, methods)
+
+    results = []
+    seeded = 0
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for corpus in sorted(args.corpus):
+                print(f"Corpus {corpus}:")
+                seed(sqlite_db, embedding_codec, seeded, corpus)
+                seeded = corpus
+                started = time.perf_counter()
+                await asyncio.to_thread(questions.sync_index)
+                print(f"  index loaded in {time.perf_counter() - started:.2f}s")
+                results.extend(await bench_corpus(client, corpus, args))
+
+    print()
+    print_table(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--corpus", type=lambda value: [int(size) for size in value.split(",")],
+                        default=[1000, 10000], help="Comma-separated corpus sizes (default: 1000,10000)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint per corpus size")
+    parser.add_argument("--investigations", type=int, default=20, help="Investigations per corpus size")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--dimension", type=int, default=768, help="Embedding dimension")
+    parser.add_argument("--vector-index", choices=["numpy", "qdrant"], default="numpy")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per Gemini call")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds per embedding batch")
+    parser.add_argument("--research-latency", type=float, default=0.0, help="Seconds per research run")
+    parser.add_argument("--storage-latency", type=float, default=0.0, help="Seconds per storage call")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency jitter as a fraction of the mean")
+    parser.add_argument("--json", help="Also write the results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="verifix-bench-")
+    os.environ.update({
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": os.path.join(workdir, "bench.sqlite3"),
+        "VECTOR_INDEX": args.vector_index,
+        "QDRANT_PATH": os.path.join(workdir, "qdrant"),
+        "EMBEDDING_DIMENSION": str(args.dimension),
+        "EMBEDDING_CACHE_PATH": "",
+        "INVESTIGATION_QUEUE_SIZE": str(max(args.investigations, 20)),
+    })
+    fakes.latency = fakes.Latency(
+        llm=args.llm_latency, embedding=args.embedding_latency, research=args.research_latency,
+        storage=args.storage_latency, jitter=args.jitter,
+    )
+    fakes.install(args.dimension)
+    # The application uses flat imports and serves static files relative to its directory
+    sys.path.insert(0, str(APP_DIR))
+    os.chdir(APP_DIR)
+    asyncio.run(main(args))